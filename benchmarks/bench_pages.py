@@ -0,0 +1,142 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# ---------------------------------------------------------
+# ページ描画のベンチマーク
+# ---------------------------------------------------------
+# 使い方（リポジトリのルートで）:
+#   python benchmarks/bench_pages.py --topics 10 100 500 --votes 1000 10000
+#
+# メモリ上の偽スプレッドシート（fake_sheets.py）に議題 N 件・投票 M 件を入れ、
+# Streamlit の AppTest で各ページを実行して、描画時間・API呼び出し回数・
+# 読み込んだ行数・ピークメモリを表にする。
+#   cold : キャッシュが空の状態で最初に開いたとき
+#   warm : 何も操作せずに再実行したとき
+#   vote / create : 投票・議題作成の操作をしたとき
+# --option-ids を付けると、選択肢の表に移行した後の形（票は option_id だけ）のシートで計る。
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(BENCH_DIR), "my_voting_app")
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import db_handler  # noqa: E402
+import sheets_backend  # noqa: E402
+import storage  # noqa: E402
+from fake_sheets import seeded_spreadsheet  # noqa: E402
+
+USER = "bench@example.com"
+PAGES = {
+    "list": "pages/1_議題一覧.py",
+    "create": "pages/2_新規作成.py",
+    "results": "pages/3_投票結果.py",
+}
+
+
+def install(spreadsheet):
+    # 本物の接続の代わりに偽スプレッドシートを返すようにし、キャッシュも空にする
+    sheets_backend.reset_connection()
+    sheets_backend.connect_to_sheet = lambda force_refresh=False: spreadsheet
+    storage.set_backend(sheets_backend.SheetsBackend())
+    db_handler.clear_cache()
+
+
+def new_app(page):
+    at = AppTest.from_file(os.path.join(APP_DIR, PAGES[page]), default_timeout=120)
+    at.session_state["logged_in_user"] = USER
+    return at
+
+
+def measure(spreadsheet, run):
+    calls_before = spreadsheet.api_calls()
+    rows_before = spreadsheet.calls["rows_transferred"]
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    at = run()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    errors = [e.value for e in at.exception]
+    if errors:
+        raise RuntimeError(f"ページの実行でエラーが発生しました: {errors[0]}")
+    return {
+        "seconds": round(elapsed, 4),
+        "api_calls": spreadsheet.api_calls() - calls_before,
+        "rows": spreadsheet.calls["rows_transferred"] - rows_before,
+        "peak_mb": round(peak / 1024 / 1024, 2),
+    }, at
+
+
+def bench_size(n_topics, n_votes, option_ids=False):
+    spreadsheet = seeded_spreadsheet(n_topics, n_votes, owner_email=USER, option_ids=option_ids)
+    results = []
+
+    def record(page, scenario, stats):
+        results.append({"topics": n_topics, "votes": n_votes, "page": page, "scenario": scenario, **stats})
+
+    for page in ("list", "results"):
+        install(spreadsheet)
+        at = new_app(page)
+        stats, at = measure(spreadsheet, lambda: at.run())
+        record(page, "cold", stats)
+        stats, at = measure(spreadsheet, lambda: at.run())
+        record(page, "warm", stats)
+
+        if page == "list":
+            vote_buttons = [b for b in at.button if b.key and b.key.startswith("vote_")]
+            if vote_buttons:
+                vote_buttons[0].click()
+                stats, at = measure(spreadsheet, lambda: at.run())
+                record(page, "vote", stats)
+                db_handler.flush_votes(timeout=30)
+
+    install(spreadsheet)
+    at = new_app("create")
+    at.run()
+    at.text_input(key="input_title").input("ベンチマーク議題")
+    at.text_input(key="input_author").input("bench")
+    at.text_input(key="option_0").input("A")
+    at.text_input(key="option_1").input("B")
+    create_button = next(b for b in at.button if b.label == "この内容で議題を作成する")
+    create_button.click()
+    stats, at = measure(spreadsheet, lambda: at.run())
+    record("create", "create", stats)
+    return results
+
+
+def print_table(rows):
+    columns = ["topics", "votes", "page", "scenario", "seconds", "api_calls", "rows", "peak_mb"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print("  ".join(c.rjust(widths[c]) for c in columns))
+    for r in rows:
+        print("  ".join(str(r[c]).rjust(widths[c]) for c in columns))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="投票アプリのページ描画ベンチマーク")
+    parser.add_argument("--topics", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--votes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--option-ids", action="store_true", help="移行後の形（票は選択肢の番号だけ）のシートで計る")
+    parser.add_argument("--json", metavar="PATH", help="結果を JSON で保存する")
+    args = parser.parse_args(argv)
+
+    tracemalloc.start()
+    rows = []
+    for n_topics in args.topics:
+        for n_votes in args.votes:
+            rows.extend(bench_size(n_topics, n_votes, args.option_ids))
+    tracemalloc.stop()
+
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+# ---------------------------------------------------------
+# 複数レプリカでの共有キャッシュのベンチマーク
+# ---------------------------------------------------------
+# 使い方（リポジトリのルートで）:
+#   python benchmarks/bench_replicas.py --replicas 4 --rounds 20 --topics 100 --votes 10000
+#
+# db_handler をレプリカの数だけ別々に読み込み（キャッシュはそれぞれ別）、同じ偽スプレッドシートに
+# つなぐ。各ラウンドで全レプリカの手元のキャッシュが切れた状態から議題一覧と集計を読み、
+# 1台が1票入れる。共有キャッシュなし / Redis（fake_redis.py の代わりのサーバー）/ ファイルで
+# スプレッドシートへの API 呼び出し回数と読んだ行数を比べる。
+# seconds には [sheets] requests_per_minute による待ち時間も含まれる。
+# 最後に、別のレプリカで入れた票がどのレプリカの集計にも入っているかを確かめる。
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(BENCH_DIR), "my_voting_app")
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import sheets_backend  # noqa: E402
+import shared_cache  # noqa: E402
+from fake_redis import FakeRedisServer  # noqa: E402
+from fake_sheets import seeded_spreadsheet  # noqa: E402
+
+
+def load_replica(index):
+    # 本番ではプロセスごとに別の db_handler・別の接続になるのを、モジュールを別名で読み込んで再現する
+    spec = importlib.util.spec_from_file_location(f"db_handler_replica{index}", os.path.join(APP_DIR, "db_handler.py"))
+    replica = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(replica)
+    backend = sheets_backend.SheetsBackend()
+    replica.get_backend = lambda: backend
+    return replica
+
+
+def bench(kind, n_replicas, n_rounds, n_topics, n_votes):
+    spreadsheet = seeded_spreadsheet(n_topics, n_votes)
+    sheets_backend.reset_connection()
+    sheets_backend.connect_to_sheet = lambda force_refresh=False: spreadsheet
+
+    server = None
+    if kind == "redis":
+        server = FakeRedisServer().start()
+        shared_cache.set_shared_cache(shared_cache.RedisCache(server.url))
+    elif kind == "file":
+        shared_cache.set_shared_cache(shared_cache.FileCache(tempfile.mkdtemp(prefix="shared_cache_")))
+    else:
+        shared_cache.set_shared_cache(None)
+
+    try:
+        replicas = [load_replica(i) for i in range(n_replicas)]
+        uuids = [row[7] for row in spreadsheet.worksheet("topics").data[1:] if row[5] == "active"]
+        calls_before = spreadsheet.api_calls()
+        rows_before = spreadsheet.calls["rows_transferred"]
+        start = time.perf_counter()
+        for round_no in range(n_rounds):
+            for replica in replicas:
+                # 手元のキャッシュが切れた状態から読む
+                replica.clear_cache()
+                replica.get_topics_from_sheet()
+                replica.get_vote_tally()
+            voter = replicas[round_no % n_replicas]
+            voter.add_vote_to_sheet("議題", "賛成", f"replica-voter{round_no}@example.com", uuids[round_no % len(uuids)])
+        elapsed = time.perf_counter() - start
+        api_calls = spreadsheet.api_calls() - calls_before
+        rows = spreadsheet.calls["rows_transferred"] - rows_before
+
+        # 最後の票は別のレプリカ（書き込み待ちのまま）でも投票済みに見えるか
+        last = n_rounds - 1
+        for replica in replicas:
+            replica.clear_cache()
+        seen = all(
+            replica.get_vote_tally().has_voted(uuids[last % len(uuids)], f"replica-voter{last}@example.com")
+            for replica in replicas
+        )
+        for replica in replicas:
+            replica.flush_votes(timeout=30)
+    finally:
+        shared_cache.set_shared_cache(None)
+        if server is not None:
+            server.stop()
+
+    return {
+        "cache": kind,
+        "replicas": n_replicas,
+        "rounds": n_rounds,
+        "seconds": round(elapsed, 3),
+        "api_calls": api_calls,
+        "rows": rows,
+        "redis_cmds": sum(server.calls.values()) if server is not None else 0,
+        "vote_seen": seen,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="複数レプリカでの共有キャッシュのベンチマーク")
+    parser.add_argument("--replicas", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--topics", type=int, default=100)
+    parser.add_argument("--votes", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    rows = [bench(kind, args.replicas, args.rounds, args.topics, args.votes) for kind in ("none", "redis", "file")]
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print("  ".join(c.rjust(widths[c]) for c in columns))
+    for r in rows:
+        print("  ".join(str(r[c]).rjust(widths[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import Counter
+
+# ---------------------------------------------------------
+# 起動直後（コールドスタート）のベンチマーク
+# ---------------------------------------------------------
+# 使い方（リポジトリのルートで）:
+#   python benchmarks/bench_startup.py --topics 100 --votes 10000
+#
+# ページごとに新しい Python プロセスを起動し（サーバーを起動し直した直後の状態）、
+# streamlit を読み込んだ後で最初の1回を描画する。
+#   import_s     : 最初の描画までに読み込んだモジュールの合計時間（python -X importtime）
+#   first_s      : 最初の描画にかかった時間（モジュールの読み込み・保存先の読み込みを含む）
+#   warm_s       : 同じプロセスで2回目に描画したときの時間
+#   heaviest     : 読み込みに時間がかかった上位のパッケージ（トップレベルのパッケージごとの合計）
+# 保存先は fake_sheets.py の偽スプレッドシート（ネットワークの待ち時間は含まない）。
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(BENCH_DIR), "my_voting_app")
+PAGES = {
+    "home": "Home.py",
+    "list": "pages/1_議題一覧.py",
+    "create": "pages/2_新規作成.py",
+    "results": "pages/3_投票結果.py",
+}
+START_MARK = "--- bench_startup: start ---"
+END_MARK = "--- bench_startup: end ---"
+USER = "bench@example.com"
+# 偽スプレッドシートなどベンチマーク側で読み込むモジュールは数えない
+HARNESS_MODULES = ("fake_sheets", "bench_pages")
+
+
+def run_child(page, n_topics, n_votes):
+    # 新しいプロセスの中：ここまでで streamlit だけ読み込んだ状態にしてから計る
+    sys.path.insert(0, APP_DIR)
+    sys.path.insert(0, BENCH_DIR)
+    from streamlit.testing.v1 import AppTest
+
+    print(START_MARK, file=sys.stderr, flush=True)
+    start = time.perf_counter()
+    import bench_pages
+    from fake_sheets import seeded_spreadsheet
+    bench_pages.install(seeded_spreadsheet(n_topics, n_votes, owner_email=USER))
+    at = AppTest.from_file(os.path.join(APP_DIR, PAGES[page]), default_timeout=120)
+    if page != "home":
+        at.session_state["logged_in_user"] = USER
+    at.run()
+    first = time.perf_counter() - start
+    print(END_MARK, file=sys.stderr, flush=True)
+
+    start = time.perf_counter()
+    at.run()
+    warm = time.perf_counter() - start
+    errors = [e.value for e in at.exception]
+    print(json.dumps({"first_s": first, "warm_s": warm, "errors": errors}))
+
+
+def parse_importtime(stderr):
+    # "import time: self [us] | cumulative | imported package" の行を START〜END の間だけ集める
+    total_us = 0
+    packages = Counter()
+    counting = False
+    for line in stderr.splitlines():
+        if line == START_MARK:
+            counting = True
+            continue
+        if line == END_MARK:
+            break
+        m = re.match(r"import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)", line)
+        if not counting or m is None:
+            continue
+        package = m.group(2).split(".")[0]
+        if package in HARNESS_MODULES:
+            continue
+        total_us += int(m.group(1))
+        packages[package] += int(m.group(1))
+    return total_us / 1e6, packages
+
+
+def bench_page(page, n_topics, n_votes, n_heaviest):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--child", page,
+         "--topics", str(n_topics), "--votes", str(n_votes)],
+        capture_output=True, text=True, cwd=APP_DIR,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{page} の計測に失敗しました:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    if result["errors"]:
+        raise RuntimeError(f"{page} の実行でエラーが発生しました: {result['errors'][0]}")
+    import_s, packages = parse_importtime(proc.stderr)
+    return {
+        "page": page,
+        "import_s": round(import_s, 3),
+        "first_s": round(result["first_s"], 3),
+        "warm_s": round(result["warm_s"], 3),
+        "heaviest": ", ".join(f"{name} {us / 1e6:.2f}s" for name, us in packages.most_common(n_heaviest)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="投票アプリの起動直後のベンチマーク")
+    parser.add_argument("--pages", nargs="+", choices=sorted(PAGES), default=list(PAGES))
+    parser.add_argument("--topics", type=int, default=100)
+    parser.add_argument("--votes", type=int, default=10000)
+    parser.add_argument("--heaviest", type=int, default=3, help="表示する重いパッケージの数")
+    parser.add_argument("--json", metavar="PATH", help="結果を JSON で保存する")
+    parser.add_argument("--child", choices=sorted(PAGES), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args.child, args.topics, args.votes)
+        return
+
+    rows = [bench_page(page, args.topics, args.votes, args.heaviest) for page in args.pages]
+    columns = ["page", "import_s", "first_s", "warm_s", "heaviest"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for r in rows:
+        print("  ".join(str(r[c]).ljust(widths[c]) for c in columns))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
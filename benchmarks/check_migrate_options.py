@@ -0,0 +1,139 @@
+import argparse
+import copy
+import os
+import sqlite3
+import sys
+import tempfile
+
+# ---------------------------------------------------------
+# 選択肢の表への移行（migrate_options）の確認
+# ---------------------------------------------------------
+# 使い方（リポジトリのルートで）:
+#   python benchmarks/check_migrate_options.py --topics 40 --votes 5000
+#
+# 移行前の形の偽スプレッドシート（fake_sheets.py）と、同じ中身の SQLite のデータベースを作り、
+# 締め切った議題の一部をアーカイブへ移してから移行する。保存先ごとに次を確かめる。
+#   - 移行の前後で、どの議題の counts_for（アーカイブを含む）も同じ
+#   - 2回目の移行は何も書き換えない（件数が 0 で、シート・テーブルの中身も同じ）
+#   - 書き換える前の票が CSV に残っている
+# どれかが違えば終了コード 1 で終わる。
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(BENCH_DIR), "my_voting_app")
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import db_handler  # noqa: E402
+import sheets_backend  # noqa: E402
+import sqlite_backend  # noqa: E402
+import storage  # noqa: E402
+from fake_sheets import seeded_spreadsheet  # noqa: E402
+
+
+def install_sheets(spreadsheet):
+    sheets_backend.reset_connection()
+    sheets_backend.connect_to_sheet = lambda force_refresh=False: spreadsheet
+    storage.set_backend(sheets_backend.SheetsBackend())
+    db_handler.clear_cache()
+
+
+def install_sqlite(spreadsheet, path):
+    # 偽スプレッドシートと同じ議題・投票を入れる（票は選択肢の文字列だけ、移行前の形）
+    backend = sqlite_backend.SQLiteBackend(path)
+    for name, append in (("topics", backend.append_topics), ("votes", backend.append_votes)):
+        header, *rows = spreadsheet.worksheet(name).data
+        append([dict(zip(header, row)) for row in rows])
+    storage.set_backend(backend)
+    db_handler.clear_cache()
+
+
+def all_counts():
+    # 議題（アーカイブを含む）の uuid -> counts_for
+    counts = {}
+    tally = db_handler.get_vote_tally()
+    for uuid in db_handler.get_topics_from_sheet(raise_errors=True)["uuid"].astype(str):
+        counts[uuid] = tally.counts_for(uuid)
+    archived_tally = db_handler.get_archived_vote_tally()
+    for uuid in db_handler.get_archived_topics(raise_errors=True)["uuid"].astype(str):
+        counts[uuid] = archived_tally.counts_for(uuid)
+    return counts
+
+
+def sheets_snapshot(spreadsheet):
+    return {title: copy.deepcopy(ws.data) for title, ws in spreadsheet._worksheets.items()}
+
+
+def sqlite_snapshot(path):
+    with sqlite3.connect(path) as conn:
+        return list(conn.iterdump())
+
+
+def check(kind, n_topics, n_votes):
+    spreadsheet = seeded_spreadsheet(n_topics, n_votes)
+    if kind == "sheets":
+        install_sheets(spreadsheet)
+        snapshot = lambda: sheets_snapshot(spreadsheet)  # noqa: E731
+    else:
+        path = os.path.join(tempfile.mkdtemp(prefix="migrate_"), "voting_app.db")
+        install_sqlite(spreadsheet, path)
+        snapshot = lambda: sqlite_snapshot(path)  # noqa: E731
+
+    archived = db_handler.archive_finished_topics(retention_days=0)
+    before = all_counts()
+
+    backup_dir = tempfile.mkdtemp(prefix="migration_backup_")
+    first = db_handler.migrate_options(backup_dir=backup_dir)
+    db_handler.clear_cache()
+    after = all_counts()
+
+    state = snapshot()
+    second = db_handler.migrate_options(backup_dir=backup_dir)
+    db_handler.clear_cache()
+
+    failures = []
+    if before != after:
+        changed = [uuid for uuid in before if before[uuid] != after.get(uuid)]
+        failures.append(f"票数が変わった議題 {len(changed)} 件（例: {changed[0] if changed else '-'}）")
+    if not first["votes"]:
+        failures.append("1回目の移行で番号を付けた票がありません")
+    if any(second[key] for key in ("options", "votes", "archived_votes")) or snapshot() != state:
+        failures.append(f"2回目の移行で書き換えがありました: {second}")
+    if len(first["backups"]) != (first["votes"] > 0) + (first["archived_votes"] > 0):
+        failures.append(f"書き換える前の票の CSV がそろっていません: {first['backups']}")
+
+    return {
+        "backend": kind,
+        "topics": len(before),
+        "archived": len(archived),
+        "options": first["options"],
+        "votes": first["votes"],
+        "archived_votes": first["archived_votes"],
+        "rerun": second["votes"] + second["archived_votes"] + second["options"],
+        "ok": not failures,
+    }, failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="選択肢の表への移行の前後で票数が変わらないことを確かめる")
+    parser.add_argument("--topics", type=int, default=40)
+    parser.add_argument("--votes", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    rows, failures = [], []
+    for kind in ("sheets", "sqlite"):
+        row, problems = check(kind, args.topics, args.votes)
+        rows.append(row)
+        failures += [f"{kind}: {p}" for p in problems]
+
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print("  ".join(c.rjust(widths[c]) for c in columns))
+    for r in rows:
+        print("  ".join(str(r[c]).rjust(widths[c]) for c in columns))
+    for failure in failures:
+        print(failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
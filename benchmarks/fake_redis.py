@@ -0,0 +1,150 @@
+import socketserver
+import threading
+import time
+from collections import Counter
+
+# ---------------------------------------------------------
+# ベンチマーク・動作確認用：ローカルで動く Redis の代わり
+# ---------------------------------------------------------
+# shared_cache.RedisCache が使うコマンドだけを RESP プロトコルで受け付ける。
+#   server = FakeRedisServer(); server.start()
+#   RedisCache(server.url) ...
+#   server.stop()
+# 受けたコマンドの回数を calls に数える。
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                args = self._read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            try:
+                reply = self.server.execute(args)
+            except Exception as e:
+                reply = e
+            self.wfile.write(_encode(reply))
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            raise ValueError(line)
+        args = []
+        for _ in range(int(line[1:-2])):
+            size = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+
+def _encode(reply):
+    if isinstance(reply, Exception):
+        return b"-ERR %s\r\n" % str(reply).encode()
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, bool):
+        return b"+OK\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(_encode(item) for item in reply)
+    raise TypeError(reply)
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), _Handler)
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._data = {}  # キー -> [値（bytes / int / list）, 期限の時刻 or None]
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f"redis://{host}:{port}/0"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-redis", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def _live(self, key):
+        item = self._data.get(key)
+        if item is not None and item[1] is not None and item[1] < time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    def execute(self, args):
+        name = args[0].decode().upper()
+        self.calls[name] += 1
+        with self._lock:
+            return getattr(self, "_cmd_" + name.lower())(*args[1:])
+
+    def _cmd_ping(self):
+        return True
+
+    def _cmd_auth(self, password):
+        return True
+
+    def _cmd_select(self, db):
+        return True
+
+    def _cmd_get(self, key):
+        item = self._live(key)
+        return None if item is None else str(item[0]).encode() if isinstance(item[0], int) else item[0]
+
+    def _cmd_set(self, key, value, *options):
+        expires_at = None
+        if len(options) >= 2 and options[0].upper() in (b"PX", b"EX"):
+            scale = 1000 if options[0].upper() == b"PX" else 1
+            expires_at = time.monotonic() + int(options[1]) / scale
+        self._data[key] = [value, expires_at]
+        return True
+
+    def _cmd_del(self, *keys):
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def _cmd_incr(self, key):
+        item = self._live(key) or [b"0", None]
+        item[0] = int(item[0]) + 1
+        self._data[key] = item
+        return item[0]
+
+    def _cmd_rpush(self, key, *values):
+        item = self._live(key) or [[], None]
+        item[0].extend(values)
+        self._data[key] = item
+        return len(item[0])
+
+    def _cmd_lrange(self, key, start, stop):
+        item = self._live(key)
+        if item is None:
+            return []
+        start, stop = int(start), int(stop)
+        return item[0][start:None if stop == -1 else stop + 1]
+
+    def _cmd_pexpire(self, key, ms):
+        item = self._live(key)
+        if item is None:
+            return 0
+        item[1] = time.monotonic() + int(ms) / 1000
+        return 1
+
+    def _cmd_flushall(self):
+        self._data.clear()
+        return True
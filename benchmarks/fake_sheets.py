@@ -0,0 +1,242 @@
+import datetime
+import random
+import re
+import uuid as uuid_lib
+from collections import Counter
+import gspread
+
+# ---------------------------------------------------------
+# ベンチマーク用：メモリ上で動く gspread の代わり
+# ---------------------------------------------------------
+# sheets_backend.connect_to_sheet の戻り値と差し替えて使う。
+# アプリが使う Worksheet のメソッドだけを実装し、呼ばれた回数を calls に数える。
+
+TOPIC_HEADER = ["title", "author", "options", "deadline", "created_at", "status", "owner_email", "uuid"]
+VOTE_HEADER = ["topic_title", "option", "voted_at", "voted_email", "uuid"]
+OPTION_HEADER = ["uuid", "option_id", "option"]
+OPTIONS = ["賛成", "反対", "保留", "その他"]
+
+
+class FakeCell:
+    def __init__(self, row, col, value):
+        self.row = row
+        self.col = col
+        self.value = value
+
+
+def _col_number(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - ord("A") + 1
+    return n
+
+
+class FakeWorksheet:
+    def __init__(self, title, header, rows, calls, sheet_id=0):
+        self.title = title
+        self.id = sheet_id
+        # ヘッダーが無ければ空のシート（add_worksheet で作った直後）
+        self.data = ([list(header)] if header else []) + [[str(v) for v in row] for row in rows]
+        self.calls = calls
+        self.col_count = 26
+
+    def _count(self, name, rows=0):
+        self.calls[name] += 1
+        self.calls["rows_transferred"] += rows
+
+    # --- 読み込み ---
+    def get_all_records(self, **kwargs):
+        self._count("get_all_records", max(len(self.data) - 1, 0))
+        if not self.data:
+            return []
+        header = self.data[0]
+        return [dict(zip(header, row + [""] * (len(header) - len(row)))) for row in self.data[1:]]
+
+    def get_all_values(self, **kwargs):
+        self._count("get_all_values", len(self.data))
+        return [list(row) for row in self.data]
+
+    def row_values(self, row, **kwargs):
+        self._count("row_values", 1)
+        return list(self.data[row - 1]) if row <= len(self.data) else []
+
+    def col_values(self, col, **kwargs):
+        self._count("col_values", len(self.data))
+        return [row[col - 1] if len(row) >= col else "" for row in self.data]
+
+    def cell(self, row, col, **kwargs):
+        self._count("cell", 1)
+        # 範囲外・空のセルは API と同じく空の値
+        cells = self.data[row - 1] if row <= len(self.data) else []
+        return FakeCell(row, col, cells[col - 1] if col <= len(cells) else "")
+
+    def find(self, query, **kwargs):
+        self._count("find", len(self.data))
+        for i, row in enumerate(self.data):
+            for j, value in enumerate(row):
+                if value == query:
+                    return FakeCell(i + 1, j + 1, value)
+        return None
+
+    def get(self, range_name=None, **kwargs):
+        values = self._range(range_name)
+        self._count("get", len(values))
+        return values
+
+    def batch_get(self, ranges, **kwargs):
+        result = [self._range(r) for r in ranges]
+        self._count("batch_get", sum(len(v) for v in result))
+        return result
+
+    def _range(self, range_name):
+        # "1:1" / "A2:E" / "H2:H" / "A10:E20" 形式だけ扱う
+        m = re.fullmatch(r"(\d+):(\d+)", range_name)
+        if m:
+            return [list(row) for row in self.data[int(m.group(1)) - 1:int(m.group(2))]]
+        m = re.fullmatch(r"([A-Z]+)(\d*):([A-Z]+)(\d*)", range_name)
+        c1, c2 = _col_number(m.group(1)), _col_number(m.group(3))
+        r1 = int(m.group(2) or 1)
+        r2 = int(m.group(4) or len(self.data))
+        rows = [row[c1 - 1:c2] for row in self.data[r1 - 1:r2]]
+        # API と同じく、末尾の空行は返さない
+        while rows and not any(rows[-1]):
+            rows.pop()
+        return rows
+
+    # --- 書き込み ---
+    def append_row(self, values, **kwargs):
+        self._count("append_row", 1)
+        self.data.append([str(v) for v in values])
+        row = len(self.data)
+        return {"updates": {"updatedRange": f"{self.title}!A{row}:Z{row}"}}
+
+    def append_rows(self, values, **kwargs):
+        self._count("append_rows", len(values))
+        start = len(self.data) + 1
+        self.data.extend([str(v) for v in row] for row in values)
+        return {"updates": {"updatedRange": f"{self.title}!A{start}:Z{len(self.data)}"}}
+
+    def update_cell(self, row, col, value):
+        self._count("update_cell", 1)
+        self._set(row, col, value)
+
+    def batch_update(self, data, **kwargs):
+        # [{"range": "B2:B10", "values": [[...], ...]}, ...] の値の書き込みだけ扱う
+        self._count("batch_update", sum(len(d["values"]) for d in data))
+        for d in data:
+            m = re.fullmatch(r"([A-Z]+)(\d+):[A-Z]+\d*", d["range"])
+            col, row = _col_number(m.group(1)), int(m.group(2))
+            for i, values in enumerate(d["values"]):
+                for j, value in enumerate(values):
+                    self._set(row + i, col + j, value)
+        return {"responses": []}
+
+    def add_cols(self, cols):
+        self._count("add_cols")
+        self.col_count += cols
+
+    def _set(self, row, col, value):
+        while len(self.data) < row:
+            self.data.append([])
+        cells = self.data[row - 1]
+        cells.extend([""] * (col - len(cells)))
+        cells[col - 1] = str(value)
+
+
+class FakeSpreadsheet:
+    def __init__(self, worksheets=None):
+        self.calls = Counter()
+        self._worksheets = {}
+        for title, (header, rows) in (worksheets or {}).items():
+            self._add(title, header, rows)
+
+    def _add(self, title, header, rows=()):
+        self._worksheets[title] = FakeWorksheet(title, header, rows, self.calls, sheet_id=len(self._worksheets))
+        return self._worksheets[title]
+
+    def add_worksheet(self, title, rows, cols, index=None):
+        self.calls["add_worksheet"] += 1
+        return self._add(title, None)
+
+    def worksheet(self, title):
+        self.calls["worksheet"] += 1
+        if title not in self._worksheets:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return self._worksheets[title]
+
+    def batch_update(self, body):
+        # 行の削除（deleteDimension）だけ扱う
+        self.calls["batch_update"] += 1
+        by_id = {ws.id: ws for ws in self._worksheets.values()}
+        for request in body["requests"]:
+            r = request["deleteDimension"]["range"]
+            del by_id[r["sheetId"]].data[r["startIndex"]:r["endIndex"]]
+        return {"replies": []}
+
+    def get_lastUpdateTime(self):
+        # 書き込み系の呼び出し回数を更新日時の代わりにする
+        self.calls["get_lastUpdateTime"] += 1
+        writes = ("append_row", "append_rows", "update_cell", "batch_update", "add_worksheet", "add_cols")
+        return str(sum(self.calls[name] for name in writes))
+
+    def api_calls(self):
+        return sum(n for name, n in self.calls.items() if name != "rows_transferred")
+
+
+def seeded_spreadsheet(n_topics, n_votes, owner_email="bench@example.com", seed=0, option_ids=False):
+    # 議題 n_topics 件・投票 n_votes 件のシートを作る。
+    # 議題の半分は締め切り前、1/4 は締め切り済み、残りは終了済み。4件に1件は自由記述。
+    # option_ids=True なら options シートを作り、選択式の票は option_id だけを書く（移行後の形）。
+    # False なら選択肢の文字列だけを書く（移行前の形）
+    rnd = random.Random(seed)
+    now = datetime.datetime.now()
+    topics = []
+    for i in range(n_topics):
+        if i % 4 < 2:
+            deadline = now + datetime.timedelta(days=rnd.randint(1, 30))
+        else:
+            deadline = now - datetime.timedelta(days=rnd.randint(1, 30))
+        options = "FREE_INPUT" if i % 4 == 3 else "/".join(OPTIONS[:rnd.randint(2, 4)])
+        topics.append([
+            f"議題 {i}",
+            f"作成者 {i % 7}",
+            options,
+            deadline.strftime("%Y-%m-%d %H:%M"),
+            now.strftime("%Y-%m-%d %H:%M:%S"),
+            "closed" if i % 4 == 3 else "active",
+            owner_email if i % 3 == 0 else f"owner{i % 5}@example.com",
+            str(uuid_lib.UUID(int=rnd.getrandbits(128))),
+        ])
+
+    votes = []
+    for j in range(n_votes):
+        topic = topics[rnd.randrange(n_topics)] if topics else ["", "", "A", "", "", "", "", ""]
+        options = topic[2].split("/") if topic[2] != "FREE_INPUT" else [f"意見 {j % 50}"]
+        option = rnd.choice(options)
+        votes.append([
+            topic[0],
+            option,
+            now.strftime("%Y-%m-%d %H:%M:%S"),
+            f"voter{j}@example.com",
+            topic[7],
+        ])
+        if option_ids:
+            choice = topic[2] != "FREE_INPUT"
+            votes[-1][1] = "" if choice else option
+            votes[-1].append(options.index(option) if choice else "")
+
+    if not option_ids:
+        return FakeSpreadsheet({
+            "topics": (TOPIC_HEADER, topics),
+            "votes": (VOTE_HEADER, votes),
+        })
+    option_rows = [
+        [topic[7], i, option]
+        for topic in topics if topic[2] != "FREE_INPUT"
+        for i, option in enumerate(topic[2].split("/"))
+    ]
+    return FakeSpreadsheet({
+        "topics": (TOPIC_HEADER, topics),
+        "votes": (VOTE_HEADER + ["option_id"], votes),
+        "options": (OPTION_HEADER, option_rows),
+    })
@@ -1,10 +1,9 @@
 import streamlit as st
 import os
-from PIL import Image
-import base64
-import google_auth_oauthlib.flow
-import json # ▼追加：Cloudの設定を読み込むために必要
-from background import set_background
+import login  # OAuth の設定・公開鍵はプロセス内で使い回す
+import storage
+from background import set_background, image_src
+from settings import get_setting
 
 # ---------------------------------------------------------
 # 1. 設定 & 定数
@@ -14,16 +13,8 @@ APP_DESCRIPTION = "チームの意見を一つに。新しい議題を作った
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PAGEICON_PATH = os.path.join(BASE_DIR, "images/icon_01.png")
 
-# Googleログイン設定
-CLIENT_SECRETS_FILE = os.path.join(BASE_DIR, "client_secret.json")
-SCOPES = ['openid', 'https://www.googleapis.com/auth/userinfo.email']
-
-# ▼▼▼ 修正：CloudとローカルでURLを自動切り替え ▼▼▼
-# Secretsに "auth" 設定があればCloud用のURLを使う
-if "auth" in st.secrets and "redirect_uri" in st.secrets["auth"]:
-    REDIRECT_URI = st.secrets["auth"]["redirect_uri"]
-else:
-    REDIRECT_URI = 'http://localhost:8501' # ローカル用
+# Googleログイン設定（client_secret.json / Secrets の [auth]）は login.py で読みます
+# リダイレクト先も login.py で Cloud とローカルを自動で切り替えます
 
 # ---------------------------------------------------------
 # 2. ページ設定
@@ -49,11 +40,10 @@ st.markdown("""
     """, unsafe_allow_html=True)
 
 def header_with_icon(icon_path, text):
-    with open(icon_path, "rb") as f:
-        encoded = base64.b64encode(f.read()).decode()
+    # 画像の base64 化は background.image_src がプロセス内で1回だけ行う
     header_html = f"""
     <div style="display:flex; align-items:center; gap:10px;">
-        <img src="data:image/png;base64,{encoded}" width="40">
+        <img src="{image_src(icon_path)}" width="40">
         <h1 style="margin:0;">{text}</h1>
     </div>
     """
@@ -63,31 +53,14 @@ def header_with_icon(icon_path, text):
 # Googleログイン処理（Cloud対応ハイブリッド版）
 # ---------------------------------------------------------
 def google_login():
-    flow = None
-    
-    # 1. PCにファイルがあるか探す（ローカル用）
-    if os.path.exists(CLIENT_SECRETS_FILE):
-        flow = google_auth_oauthlib.flow.Flow.from_client_secrets_file(
-            CLIENT_SECRETS_FILE,
-            scopes=SCOPES,
-            redirect_uri=REDIRECT_URI
-        )
-    
-    # 2. ファイルがないならCloudのSecretsを探す（Cloud用）
-    elif "auth" in st.secrets and "client_secret_json" in st.secrets["auth"]:
-        try:
-            # Secretsの文字列をプログラムで使える形に変換
-            client_config = json.loads(st.secrets["auth"]["client_secret_json"])
-            
-            flow = google_auth_oauthlib.flow.Flow.from_client_config(
-                client_config,
-                scopes=SCOPES,
-                redirect_uri=REDIRECT_URI
-            )
-        except Exception as e:
-            st.error(f"Secrets設定エラー: {e}")
-            return None
-    else:
+    # 1. PCの client_secret.json（ローカル用）→ 2. Secrets（Cloud用）の順に探す
+    # 設定の読み込みはプロセス内で1回だけ（login.py）
+    try:
+        flow = login.new_flow()
+    except Exception as e:
+        st.error(f"Secrets設定エラー: {e}")
+        return None
+    if flow is None:
         st.error("⚠️ 認証キーが見つかりません。client_secret.jsonを置くか、Secretsを設定してください。")
         return None
 
@@ -106,12 +79,8 @@ def google_login():
             flow.fetch_token(code=code)
             credentials = flow.credentials
             
-            from google.oauth2 import id_token
-            from google.auth.transport import requests
-            
-            token_request = requests.Request()
-            id_info = id_token.verify_oauth2_token(
-                credentials.id_token, token_request, credentials.client_id)
+            # Google の公開鍵は Cache-Control の期限まで使い回す（毎回ダウンロードしない）
+            id_info = login.verify_id_token(credentials.id_token, credentials.client_id)
             
             email = id_info.get('email')
             
@@ -131,6 +100,8 @@ def main():
 
     # ログインしていない場合
     if st.session_state.logged_in_user is None:
+        # ログインしている間に保存先の準備を済ませ、最初のページを早く開けるようにする
+        storage.warm_up_backend()
         user_email = google_login()
         if user_email:
             st.session_state.logged_in_user = user_email
@@ -151,6 +122,9 @@ def main():
             st.page_link("pages/1_議題一覧.py", label="議題一覧を見る", icon="📋", help="現在進行中の投票に参加します")
             st.page_link("pages/2_新規作成.py", label="新しい議題を作成する", icon="✨", help="新しい投票トピックを立ち上げます")
             st.page_link("pages/3_投票結果.py", label="投票結果を見る", icon="📊", help="集計結果を確認します")
+            admin_emails = {storage.normalize_email(e) for e in get_setting("admin", "emails", [])}
+            if storage.normalize_email(st.session_state.logged_in_user) in admin_emails:
+                st.page_link("pages/4_診断.py", label="診断を見る（管理者）", icon="🩺", help="APIの呼び出し回数や所要時間を確認します")
 
         st.divider()
 
@@ -0,0 +1,120 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from settings import get_setting
+
+# ---------------------------------------------------------
+# Gemini による投票結果分析（バックグラウンド実行 + 結果のキャッシュ）
+# ---------------------------------------------------------
+# 分析には数秒〜十数秒かかるので、ページのスクリプトでは待たずに別スレッドで実行する。
+# 結果は (議題の uuid, 集計表のハッシュ) ごとに覚えておき、
+# 票数が変わっていなければ API を呼ばずに前回の分析をそのまま返す。
+
+MODEL_NAME = "gemini-2.5-flash"
+MAX_CACHED_ANALYSES = get_setting("ai_analysis", "max_cached", 64)
+MAX_WORKERS = get_setting("ai_analysis", "max_workers", 2)
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="gemini")
+_lock = threading.Lock()
+_jobs = OrderedDict()  # キー -> Future（古いものから捨てる）
+_client = None
+
+
+def _get_client():
+    # 分析ボタンが押されるまで genai の読み込みもクライアント作成もしない
+    global _client
+    with _lock:
+        if _client is None:
+            from google import genai
+            _client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
+        return _client
+
+
+def build_prompt(topic_title, result_df):
+    return f"""
+# 命令: あなたは厳格で経験豊富なデータアナリストです。
+以下の「制約事項」と「出力テンプレート」を**一言一句厳守**し、提供されたCSVデータを分析してください。
+
+# 制約事項 (重要)
+1. **生データの隠蔽**: 入力されたCSVデータ自体は、回答に**絶対に**含めないでください。
+2. **フォーマット厳守**: 以下の「出力テンプレート」の構造、見出し、箇条書きのスタイルを崩さないでください。
+3. **可読性向上**: 重要な数値（得票数やパーセンテージ）やキーワードは **太字** で強調してください。
+4. **客観性**: 主観的な感想は排除し、データに基づいた事実と論理的な推測のみを記述してください。
+5. **テンプレート外禁止**: テンプレートに書かれていない文言は**絶対に出力しない**でください。
+6. **終了条件**: 出力はテンプレートの最終行までで終了すること。
+
+# 出力テンプレート
+---
+## 📊 分析概要
+（ここに、データ全体から読み取れる最も重要な結論を2〜3行で簡潔に記述。）
+
+## 📈 投票傾向
+- **（傾向の要約1）**: （具体的な数値を用いる）
+- **（傾向の要約2）**
+- **（傾向の要約3）**
+
+## 🧠 支持理由の推測
+- **（推測される理由1）**
+- **（推測される理由2）**
+
+## 🔍 全体の特徴・特異点
+- （分布の特徴）
+- （特筆すべき点）
+
+# 解析対象データ
+議題:{topic_title}
+CSVデータ:{result_df.to_csv(index=False)}
+"""
+
+
+def analysis_key(topic_uuid, result_df):
+    digest = hashlib.sha256(result_df.to_csv(index=False).encode("utf-8")).hexdigest()
+    return (str(topic_uuid), digest)
+
+
+def _analyze(prompt):
+    response = _get_client().models.generate_content(
+        model=MODEL_NAME,
+        contents=prompt
+    )
+    return response.text
+
+
+def start_analysis(topic_uuid, topic_title, result_df):
+    # 同じ集計の分析が実行中・実行済みならそれを使う。戻り値は get_analysis に渡すキー
+    key = analysis_key(topic_uuid, result_df)
+    with _lock:
+        job = _jobs.get(key)
+        if job is not None and not (job.done() and job.exception() is not None):
+            _jobs.move_to_end(key)
+            return key
+
+        _jobs[key] = _executor.submit(_analyze, build_prompt(topic_title, result_df))
+        # 上限を超えたら、終わっているものから古い順に捨てる
+        for old_key in [k for k, f in _jobs.items() if f.done()]:
+            if len(_jobs) <= MAX_CACHED_ANALYSES:
+                break
+            del _jobs[old_key]
+        return key
+
+
+def get_analysis(key):
+    # 戻り値：("pending", None) / ("done", 分析文) / ("error", 例外) / (None, None)
+    with _lock:
+        job = _jobs.get(key)
+    if job is None:
+        return None, None
+    if not job.done():
+        return "pending", None
+    if job.exception() is not None:
+        return "error", job.exception()
+    return "done", job.result()
+
+
+def find_cached_analysis(topic_uuid, result_df):
+    # ボタンを押さなくても、同じ集計の分析が済んでいれば表示できるようにする
+    key = analysis_key(topic_uuid, result_df)
+    status, _ = get_analysis(key)
+    return key if status is not None else None
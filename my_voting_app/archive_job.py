@@ -0,0 +1,29 @@
+import argparse
+import db_handler
+
+# ---------------------------------------------------------
+# 終わった議題のアーカイブ（定期実行用）
+# ---------------------------------------------------------
+# 使い方（my_voting_app ディレクトリで）:
+#   python archive_job.py                    # [archive] retention_days 日を過ぎた議題を移す
+#   python archive_job.py --retention-days 7 --dry-run
+#
+# cron などで1日1回程度実行する想定。保存先は [storage] backend の設定に従う。
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="終わった議題と投票をアーカイブへ移す")
+    parser.add_argument("--retention-days", type=float, default=None,
+                        help=f"締め切りから何日たった議題を移すか（省略時 {db_handler.ARCHIVE_RETENTION_DAYS}）")
+    parser.add_argument("--dry-run", action="store_true", help="対象を表示するだけで移さない")
+    args = parser.parse_args(argv)
+
+    uuids = db_handler.archive_finished_topics(args.retention_days, dry_run=args.dry_run)
+    label = "アーカイブ対象" if args.dry_run else "アーカイブした議題"
+    print(f"{label}: {len(uuids)} 件")
+    for uuid in uuids:
+        print(f"  {uuid}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import streamlit as st
+import db_handler
+from settings import get_setting
+
+# ---------------------------------------------------------
+# 自動更新（データが変わったときだけページを再実行する）
+# ---------------------------------------------------------
+# 小さな fragment が POLL_SECONDS 秒ごとに db_handler.check_for_changes() を呼び、
+# 前回見たバージョンから変わっていたときだけページ全体を再実行する。
+# 保存先への確認はプロセス全体で [live] check_interval_seconds に1回なので、
+# 何百人が自動更新にしていても、変更が無ければ読み込みは増えない。
+POLL_SECONDS = get_setting("live", "poll_seconds", 5.0)
+
+
+def _poll(state_key):
+    version = db_handler.check_for_changes()
+    if version is None:
+        return
+    seen = st.session_state.get(state_key)
+    st.session_state[state_key] = version
+    if seen is not None and seen != version:
+        st.rerun()
+
+
+def auto_refresh(page_key):
+    # ページに「自動更新」のスイッチを置き、オンのときだけ確認を始める
+    enabled = st.toggle(
+        "🔄 自動更新",
+        key=f"auto_refresh_{page_key}",
+        help="ほかの人の投票や議題の追加があれば、自動で表示を更新します。",
+    )
+    if enabled:
+        st.fragment(run_every=POLL_SECONDS)(_poll)(f"auto_refresh_version_{page_key}")
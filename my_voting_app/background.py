@@ -1,27 +1,61 @@
 import base64
+import mimetypes
 import streamlit as st
 import os
+import threading
+
+# このファイル（background.py）があるディレクトリを基準にする
+BASE_PATH = os.path.dirname(__file__)
+STATIC_DIR = os.path.join(BASE_PATH, "static")
+
+# ---------------------------------------------------------
+# 画像の読み込み結果をプロセス内で使い回す
+# ---------------------------------------------------------
+# 再実行のたびに画像を開いて base64 化しないよう、(パス, 更新時刻) ごとに1回だけ作る。
+# 画像を差し替えると更新時刻が変わるので、自動で作り直される。
+_data_uri_cache = {}
+_data_uri_lock = threading.Lock()
+
+
+def _data_uri(image_path):
+    key = (image_path, os.path.getmtime(image_path))
+    with _data_uri_lock:
+        uri = _data_uri_cache.get(key)
+        if uri is None:
+            mime = mimetypes.guess_type(image_path)[0] or "image/png"
+            with open(image_path, "rb") as f:
+                encoded = base64.b64encode(f.read()).decode()
+            uri = f"data:{mime};base64,{encoded}"
+            # 古い更新時刻の分は捨てる
+            for old_key in [k for k in _data_uri_cache if k[0] == image_path]:
+                del _data_uri_cache[old_key]
+            _data_uri_cache[key] = uri
+        return uri
+
+
+def image_src(image_path):
+    # Streamlit の静的ファイル配信（config.toml の [server] enableStaticServing = true）が
+    # 有効で、static フォルダに同じ名前の画像があれば URL で参照する。
+    # そうでなければ base64 の data URI を埋め込む。
+    name = os.path.basename(image_path)
+    if st.get_option("server.enableStaticServing") and os.path.exists(os.path.join(STATIC_DIR, name)):
+        return f"app/static/{name}"
+    return _data_uri(image_path)
+
 
 def set_background(image_name):
-    # このファイル（background.py）があるディレクトリを基準にする
-    base_path = os.path.dirname(__file__)
-    
     # imagesフォルダの画像を参照
-    image_path = os.path.join(base_path, "images", image_name)
+    image_path = os.path.join(BASE_PATH, "images", image_name)
 
     # 画像が存在しない時のデバッグ表示（超重要）
     if not os.path.exists(image_path):
         st.error(f"背景画像が見つかりません: {image_path}")
         return
 
-    # base64化して背景適用
-    with open(image_path, "rb") as f:
-        encoded = base64.b64encode(f.read()).decode()
-
     css = f"""
     <style>
     [data-testid="stAppViewContainer"] {{
-        background-image: url("data:image/png;base64,{encoded}");
+        background-image: url("{image_src(image_path)}");
         background-size: cover;
         background-position: center;
         background-repeat: no-repeat;
@@ -0,0 +1,78 @@
+import pandas as pd
+
+# ---------------------------------------------------------
+# 作成者用ダッシュボード（自分の締切済み議題をまとめて集計）
+# ---------------------------------------------------------
+# 議題を1つずつ選んで見る代わりに、全部の議題の票数・投票率・1位と2位の差を1つの表にする。
+# 票数は VoteTally.counts_for で直した uuid -> {選択肢: 票数} から「議題 × 選択肢」の縦長の表を作り、
+# uuid で1回 groupby するだけで全議題分を求める（投票の明細は読み直さない）。
+#   投票率：この議題に投票した人 ÷ 自分の締切済み議題のどれかに投票した人
+
+SUMMARY_COLUMNS = ["uuid", "議題", "締め切り", "状態", "投票数", "投票率", "1位", "1位の票数", "2位との差", "差（pt）"]
+TIE_LABEL = "（同数）"
+
+
+def topic_labels(topics_df):
+    # 同じタイトルの議題があってもグラフで混ざらないよう、2件目以降に番号を付ける
+    titles = topics_df["title"].astype(str)
+    n = titles.groupby(titles).cumcount()
+    return titles.where(n == 0, titles + " (" + (n + 1).astype(str) + ")")
+
+
+def vote_counts(topics_df, counts):
+    # 戻り値：uuid / label / option / votes の縦長の表（票が1つも無い議題は含まない）
+    labels = dict(zip(topics_df["uuid"].astype(str), topic_labels(topics_df)))
+    rows = [
+        (uuid, label, option, votes)
+        for uuid, label in labels.items()
+        for option, votes in counts.get(uuid, {}).items()
+    ]
+    return pd.DataFrame(rows, columns=["uuid", "label", "option", "votes"])
+
+
+def summarize(topics_df, counts, voters):
+    # topics_df: 自分の締切済み議題、counts: uuid -> {選択肢: 票数}、
+    # voters: 締切済み議題のどれかに投票した人の数。戻り値：(議題ごとの表, vote_counts の表)
+    long_df = vote_counts(topics_df, counts)
+    ranked = long_df.sort_values(["uuid", "votes", "option"], ascending=[True, False, True])
+    ranked["rank"] = ranked.groupby("uuid", sort=False).cumcount()
+    totals = ranked.groupby("uuid", sort=False)["votes"].sum()
+    first = ranked[ranked["rank"] == 0].set_index("uuid")
+    second = ranked[ranked["rank"] == 1].set_index("uuid")["votes"]
+
+    uuids = topics_df["uuid"].astype(str)
+    total = uuids.map(totals).fillna(0).astype(int)
+    top_votes = uuids.map(first["votes"]).fillna(0).astype(int)
+    margin = top_votes - uuids.map(second).fillna(0).astype(int)
+    winner = uuids.map(first["option"]).fillna("")
+    summary = pd.DataFrame({
+        "uuid": uuids,
+        "議題": topic_labels(topics_df),
+        "締め切り": topics_df["deadline"],
+        "状態": topics_df["status"].astype(str).map({"closed": "終了"}).fillna("締切"),
+        "投票数": total,
+        "投票率": (total / voters * 100).round(1) if voters else 0.0,
+        "1位": winner.where((margin > 0) | (total == 0), TIE_LABEL),
+        "1位の票数": top_votes,
+        "2位との差": margin,
+        "差（pt）": (margin / total.where(total > 0) * 100).round(1).fillna(0.0),
+    }, columns=SUMMARY_COLUMNS).reset_index(drop=True)
+    return summary, long_df
+
+
+def small_multiples(long_df, columns=3):
+    # 議題ごとの小さな棒グラフを並べた1枚の図（plotly はここで初めて読み込む）
+    import plotly.express as px
+    rows = -(-long_df["label"].nunique() // columns)
+    height = max(250, 220 * rows)
+    fig = px.bar(
+        long_df, x="option", y="votes", facet_col="label", facet_col_wrap=columns,
+        # 間隔は図の高さに対する割合なので、行が増えても同じ幅（約70px）になるようにする
+        facet_col_spacing=0.06, facet_row_spacing=min(0.3, 70 / height),
+        labels={"option": "", "votes": "票数"},
+    )
+    # 議題ごとに選択肢が違うので、x 軸は共有しない
+    fig.update_xaxes(matches=None, showticklabels=True)
+    fig.for_each_annotation(lambda a: a.update(text=a.text.split("=", 1)[-1]))
+    fig.update_layout(height=height, showlegend=False)
+    return fig
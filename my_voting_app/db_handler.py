@@ -1,115 +1,952 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 import pandas as pd
 import streamlit as st
-import os
 import datetime
+import threading
+import time
+import atexit
+import logging
+import random
+import json
+import os
+import uuid as uuid_lib
+from collections import OrderedDict
+import numpy as np
+import metrics
+from settings import get_setting
+from shared_cache import get_shared_cache
+from storage import get_backend, normalize_email, TOPIC_COLUMNS, VOTE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# [metrics] port が設定されていれば Prometheus 用の /metrics を公開する
+metrics.start_exporter()
 
 # ---------------------------------------------------------
 # 設定
 # ---------------------------------------------------------
-SPREADSHEET_NAME = "voting_app_db"
-KEY_FILE = "key.json"
+# 保存先（Googleスプレッドシート / SQLite）の接続まわりは storage.py から選ばれた
+# バックエンドが持つ。ここでは保存先に依らない読み書きの窓口だけを扱う。
+
+# 読み込み結果をキャッシュしておく時間（秒）と件数の上限
+CACHE_TTL_SECONDS = get_setting("cache", "ttl_seconds", 30.0)
+CACHE_MAX_ENTRIES = get_setting("cache", "max_entries", 16)
+
+# 投票の書き込み待ち行列：この件数たまるか、この秒数たったらまとめて書き込む
+VOTE_BATCH_SIZE = get_setting("vote_queue", "batch_size", 50)
+VOTE_FLUSH_INTERVAL = get_setting("vote_queue", "flush_interval_seconds", 2.0)
+# 書き込み失敗時の再試行間隔（秒）：1, 2, 4, ... と伸ばし、この値で頭打ち
+VOTE_RETRY_MAX_DELAY = get_setting("vote_queue", "retry_max_delay_seconds", 60.0)
+# 一時的な失敗でもこの回数書き込めなければ諦め、票を VOTE_DEAD_LETTER_PATH に残す
+VOTE_MAX_ATTEMPTS = get_setting("vote_queue", "max_attempts", 10)
+VOTE_DEAD_LETTER_PATH = get_setting("vote_queue", "dead_letter_path", "failed_votes.jsonl")
+
+# 自動更新で「データが変わったか」を保存先に確かめる間隔（秒）。
+# 見ている人数に関係なく、プロセス全体でこの間隔に1回だけ確かめる
+LIVE_CHECK_INTERVAL = get_setting("live", "check_interval_seconds", 10.0)
+
+# 終わった議題を、締め切りからこの日数たったらアーカイブへ移す
+ARCHIVE_RETENTION_DAYS = get_setting("archive", "retention_days", 30.0)
+
+# レプリカ間の共有キャッシュ（[shared_cache] backend を設定したときだけ使う）：
+# 共有した値を置いておく時間（秒）、各プロセスが手元に覚えておく時間（秒）、キーの頭に付ける文字列
+SHARED_CACHE_TTL = get_setting("shared_cache", "ttl_seconds", 60.0)
+SHARED_CACHE_LOCAL_TTL = get_setting("shared_cache", "local_ttl_seconds", 2.0)
+SHARED_CACHE_PREFIX = get_setting("shared_cache", "prefix", "voting_app:")
 
 # ---------------------------------------------------------
-# Googleスプレッドシートに接続する関数
+# 読み込みキャッシュ（TTL付き・件数上限付き）
 # ---------------------------------------------------------
-def connect_to_sheet():
-    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-    
-    creds = None
-    if os.path.exists(KEY_FILE):
+# 再実行のたびに get_all_records を呼ばないよう、読み込んだ DataFrame を
+# しばらく覚えておく。書き込み時はすぐに差し替え・破棄するので、
+# 自分の投票は待たずに画面へ反映される。
+class _TTLCache:
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._items = OrderedDict()  # key -> (期限の時刻, 値)
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if time.monotonic() > expires_at:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        # ttl を渡せばこのキーだけ期限を変える
+        with self._lock:
+            self._items[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def patch(self, key, func):
+        # キャッシュ済みの値にだけ変更を当てる（期限はそのまま）
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return
+            expires_at, value = item
+            self._items[key] = (expires_at, func(value))
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._items.clear()
+            else:
+                self._items.pop(key, None)
+
+
+_cache = _TTLCache(CACHE_TTL_SECONDS, CACHE_MAX_ENTRIES)
+
+
+def clear_cache():
+    _cache.invalidate()
+
+
+# ---------------------------------------------------------
+# 読み込んだ表の型をそろえる
+# ---------------------------------------------------------
+# シートからは数字に見えるセルが int で来たり、空欄が NaN で来たりする。
+# 表全体を文字列にすると全列が object のコピーになり比較も遅いので、
+# 読み込み時に一度だけ列ごとの型に直す。
+#   - uuid / status / option / メールアドレス：カテゴリ型（同じ値が何度も出てくる列）
+#   - deadline：日時型（新規作成ページで保存している書式で読む）
+#   - option_id：int32（番号の無い票・移行前の票は -1）
+#   - メールアドレス：前後の空白を除いて小文字にそろえる
+DEADLINE_FORMAT = "%Y-%m-%d %H:%M"
+TOPIC_CATEGORY_COLUMNS = ["status", "owner_email", "uuid"]
+VOTE_CATEGORY_COLUMNS = ["option", "voted_email", "uuid"]
+EMAIL_COLUMNS = {"owner_email", "voted_email"}
+NO_OPTION_ID = -1
+
+
+def _text(column):
+    return column.fillna("").astype(str)
+
+
+def _typed_frame(df, columns, category_columns):
+    df = df.reindex(columns=list(dict.fromkeys([*columns, *df.columns])))
+    typed = {}
+    for name in df.columns:
+        if name == "deadline":
+            # 型を付け直すとき（キャッシュへの追記など）は日時型のまま使う
+            if pd.api.types.is_datetime64_any_dtype(df[name]):
+                typed[name] = df[name]
+            else:
+                typed[name] = pd.to_datetime(_text(df[name]), format=DEADLINE_FORMAT, errors="coerce")
+            continue
+        if name == "option_id":
+            typed[name] = pd.to_numeric(df[name], errors="coerce").fillna(NO_OPTION_ID).astype("int32")
+            continue
+        column = _text(df[name])
+        if name in EMAIL_COLUMNS:
+            column = column.str.strip().str.lower()
+        typed[name] = column.astype("category") if name in category_columns else column
+    return pd.DataFrame(typed, index=df.index)
+
+
+def typed_topics(df):
+    return _typed_frame(df, TOPIC_COLUMNS, TOPIC_CATEGORY_COLUMNS)
+
+
+def typed_votes(df):
+    return _typed_frame(df, VOTE_COLUMNS, VOTE_CATEGORY_COLUMNS)
+
+
+_SCHEMAS = {
+    "topics": typed_topics,
+    "votes": typed_votes,
+    "archived_topics": typed_topics,
+    "archived_votes": typed_votes,
+}
+
+
+# ---------------------------------------------------------
+# 同じ読み込みの相乗り（single-flight）
+# ---------------------------------------------------------
+# 多くの人が同時にページを開くと、キャッシュ切れの瞬間に全員が同じシートを読みに行く。
+# 実行中の同じ読み込みがあれば、新しく呼ばずにその結果を待って使う。
+class _SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # キー -> [完了イベント, 結果, 例外]
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = [threading.Event(), None, None]
+
+        if not leader:
+            call[0].wait()
+            if call[2] is not None:
+                raise call[2]
+            return call[1]
+
         try:
-            creds = ServiceAccountCredentials.from_json_keyfile_name(KEY_FILE, scope)
+            call[1] = func()
+            return call[1]
         except Exception as e:
-            st.error(f"認証ファイル(key.json)の読み込みエラー: {e}")
-            return None
+            call[2] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call[0].set()
+
+
+_single_flight = _SingleFlight()
+
+
+# ---------------------------------------------------------
+# レプリカ間の共有キャッシュ（shared_cache.py）
+# ---------------------------------------------------------
+# レプリカが何台あっても保存先の読み込みが台数分に増えないよう、議題一覧と
+# 集計（票数・投票済みの人）を共有キャッシュに置く。各プロセスは共有の値を
+# SHARED_CACHE_LOCAL_TTL 秒だけ手元に覚え、保存先を読むのは共有の値が切れたときに
+# 最初に気づいた1台だけになる。
+#   - 議題一覧：作成・終了・削除のたびに世代（topics:gen）を進める。読み込み中に
+#     世代が進んでも、その結果は古い世代のキーに置かれるので誰も使わない
+#   - 集計：票は世代ごとの投票ログ（votes_log@世代）に足していき、読むときに集計へ足す。
+#     同じ人は同じ議題に1票なので、すでに集計に入っている票は二重に数えない。
+#     集計を作り直す間に足された票を落とさないよう、票は次の世代のログにも足し、
+#     作り直した側も世代を進めた後に前の世代のログを読み直す
+# 共有キャッシュにつながらないときは、今までどおり各プロセスで保存先から読む。
+def _shared(method, key, *args, default=None):
+    cache = get_shared_cache()
+    if cache is None:
+        return default
+    try:
+        return getattr(cache, method)(SHARED_CACHE_PREFIX + key, *args)
+    except Exception as e:
+        logger.warning("共有キャッシュを使えません（%s %s）: %s", method, key, e)
+        return default
+
+
+def _local_ttl():
+    # 共有するときは、他のレプリカの変更がすぐ見えるよう手元の期限を短くする
+    return SHARED_CACHE_LOCAL_TTL if get_shared_cache() is not None else None
+
+
+def _shared_generation(name):
+    return int(_shared("get", f"{name}:gen") or 0)
+
+
+def _invalidate_shared(*names):
+    for name in names:
+        _shared("incr", f"{name}:gen")
+
+
+def _vote_entry(uuid, option, email, option_id=""):
+    return [str(uuid), str(option), normalize_email(email), option_id]
+
+
+def _share_vote(record):
+    entry = _vote_entry(record["uuid"], record["option"], record["voted_email"], record.get("option_id", ""))
+    generation = _shared_generation("tally")
+    # 世代を読んでから足すまでに他のレプリカが集計を作り直しても、次の世代で見えるようにする
+    for log_generation in (generation, generation + 1):
+        _shared("append", f"votes_log@{log_generation}", json.dumps(entry).encode("utf-8"), SHARED_CACHE_TTL)
+
+
+def _logged_votes(generation):
+    return [json.loads(item) for item in _shared("items", f"votes_log@{generation}", default=[])]
+
+
+def _load_shared_tally():
+    generation = _shared_generation("tally")
+    data = _shared("get", f"tally.json@{generation}")
+    votes = _logged_votes(generation)
+    if data is not None:
+        tally = VoteTally.from_bytes(data)
     else:
+        # 共有の集計が切れている（または最初）：保存先から作り直し、新しい世代として置く。
+        # 前の世代のログの票（他のレプリカで書き込み待ちの票）も引き継ぐ
         try:
-            if "gcp_service_account" in st.secrets:
-                key_dict = dict(st.secrets["gcp_service_account"])
-                creds = ServiceAccountCredentials.from_json_keyfile_dict(key_dict, scope)
-            else:
-                return None
+            _load_votes_into_cache()
         except Exception as e:
-            st.error(f"Secrets認証情報の読み込みエラー: {e}")
-            return None
+            st.error(f"投票読み込みエラー: {e}")
+        tally = _cache.get("tally")
+        if tally is None:
+            return VoteTally()
+        tally = tally.with_votes(votes)
+        previous = generation
+        generation = _shared("incr", "tally:gen")
+        if generation is not None:
+            # ログを読んだ後・世代を進める前に前の世代のログへ足された票も持ち込む
+            for log_generation in range(previous, generation):
+                tally = tally.with_votes(_logged_votes(log_generation))
+            _shared("set", f"tally.json@{generation}", tally.to_bytes(), SHARED_CACHE_TTL)
+        votes = []
+
+    # このプロセスの書き込み待ちの票も足しておく（共有に失敗していても自分の票は見える）
+    votes += [
+        _vote_entry(r["uuid"], r["option"], r["voted_email"], r.get("option_id", ""))
+        for r in _vote_queue.pending_rows()
+    ]
+    tally = tally.with_votes(votes)
+    _cache.set("tally", tally, ttl=_local_ttl())
+    return tally
+
+
+# 共有キャッシュの値は JSON にする（pickle だと、共有キャッシュに書ける人がアプリの中で
+# 任意のコードを動かせてしまう）。議題は文字列の表として置き、読むときに型を付け直す
+def _topics_to_bytes(df, options):
+    frame = df.assign(deadline=df["deadline"].dt.strftime(DEADLINE_FORMAT)).astype(object)
+    frame = frame.where(frame.notna(), "").astype(str)
+    return json.dumps(
+        {"columns": list(frame.columns), "rows": frame.values.tolist(), "options": options},
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+
+def _topics_from_bytes(data):
+    payload = json.loads(data)
+    df = typed_topics(pd.DataFrame(payload["rows"], columns=payload["columns"]))
+    return df, payload["options"]
+
+
+def _load_topics():
+    # 選択肢の表は議題と一緒に読み、同じ期限・同じ世代で覚える
+    generation = _shared_generation("topics")
+    data = _shared("get", f"topics.json@{generation}")
+    if data is not None:
+        df, options = _topics_from_bytes(data)
+    else:
+        backend = get_backend()
+        df = backend.read_topics()
+        if df is None:
+            return pd.DataFrame()
+        df = typed_topics(df)
+        options = _option_lists(backend.read_options())
+        _shared("set", f"topics.json@{generation}", _topics_to_bytes(df, options), SHARED_CACHE_TTL)
+    _cache.set("options", options, ttl=_local_ttl())
+    _cache.set("topics", df, ttl=_local_ttl())
+    return df
+
+
+def _load_votes_into_cache():
+    df, tally = _load_votes()
+    if df is None:
+        return pd.DataFrame()
+    _cache.set("votes", df)
+    _cache.set("tally", tally)
+    return df
 
+
+def _load_archived_topics():
+    df = typed_topics(get_backend().read_archived_topics())
+    _cache.set("archived_topics", df)
+    return df
+
+
+def _load_archived_votes():
+    df = typed_votes(get_backend().read_archived_votes())
+    _cache.set("archived_votes", df)
+    _cache.set("archived_tally", VoteTally(df))
+    return df
+
+
+_LOADERS = {
+    "topics": _load_topics,
+    "votes": _load_votes_into_cache,
+    "archived_topics": _load_archived_topics,
+    "archived_votes": _load_archived_votes,
+}
+
+
+def _read_records(sheet_name):
+    cached = _cache.get(sheet_name)
+    if cached is not None:
+        # ページ側で列を書き換えても壊れないようにコピーを返す
+        return cached.copy()
+
+    return _single_flight.do(sheet_name, _LOADERS[sheet_name]).copy()
+
+
+def _append_cached_rows(sheet_name, records):
+    schema = _SCHEMAS[sheet_name]
+    new_df = schema(pd.DataFrame(records))
+    # カテゴリの種類が違う列は object になるので、つないだ後に型を付け直す
+    _cache.patch(sheet_name, lambda df: schema(pd.concat([df, new_df], ignore_index=True)))
+
+
+def _set_cached_status(uuid, status):
+    def _patch(df):
+        if df.empty:
+            return df
+        df = df.copy()
+        if status not in df["status"].cat.categories:
+            df["status"] = df["status"].cat.add_categories([status])
+        df.loc[df["uuid"] == str(uuid), "status"] = status
+        return df
+    _cache.patch("topics", _patch)
+
+# ---------------------------------------------------------
+# 議題の選択肢（option_id -> 選択肢の文字列）
+# ---------------------------------------------------------
+# 選択肢は議題ごとに 0, 1, 2, ... の番号を振って options の表に持ち、
+# 選択式の票は番号だけを保存する。選択肢に "/" が入っていても壊れない。
+# 表に無い議題（移行前の議題・自由記述）は topics の options 列を "/" で区切って使う。
+def _option_lists(options_df):
+    # 戻り値：uuid -> 選択肢のリスト（添字が option_id）
+    if options_df is None or options_df.empty:
+        return {}
+    ids = pd.to_numeric(options_df["option_id"], errors="coerce")
+    df = options_df.assign(option_id=ids).dropna(subset=["option_id"])
+    lists = {}
+    for uuid, option_id, option in zip(df["uuid"].astype(str), df["option_id"].astype(int), df["option"].astype(str)):
+        texts = lists.setdefault(uuid, [])
+        texts.extend([None] * (option_id + 1 - len(texts)))
+        texts[option_id] = option
+    return lists
+
+
+def _topic_options():
+    options = _cache.get("options")
+    if options is None:
+        # 議題だけキャッシュに残っていても、選択肢は議題と一緒に読み直す
+        _single_flight.do("topics", _load_topics)
+        options = _cache.get("options") or {}
+    return options
+
+
+def get_topic_options(uuid, options_raw):
+    # 議題の選択肢のリスト。options 列は自由記述（"FREE_INPUT"）か、選択肢の表に移す前の議題でしか使わない
     try:
-        client = gspread.authorize(creds)
-        sheet = client.open(SPREADSHEET_NAME)
-        return sheet
+        texts = _topic_options().get(str(uuid))
     except Exception as e:
-        st.error(f"接続エラー: {e}")
-        return None
+        st.error(f"読み込みエラー: {e}")
+        texts = None
+    if texts is None:
+        return [t for t in str(options_raw).split("/") if t]
+    return [t for t in texts if t is not None]
+
+
+def _option_id(uuid, option):
+    texts = _topic_options().get(str(uuid), [])
+    return texts.index(option) if option in texts else ""
+
+
+def _option_text(texts, option_id):
+    # 表に無い番号（選択肢の行が消された等）は番号のまま見せる
+    if texts is not None and option_id < len(texts) and texts[option_id] is not None:
+        return texts[option_id]
+    return f"#{option_id}"
+
+
+def with_option_text(votes_df):
+    # option が空で option_id のある行に選択肢の文字列を入れて返す（書き出し用）
+    ids = pd.to_numeric(votes_df["option_id"], errors="coerce")
+    missing = (votes_df["option"].astype(str) == "") & ids.notna()
+    if not missing.any():
+        return votes_df
+    options = _topic_options()
+    votes_df = votes_df.copy()
+    votes_df.loc[missing, "option"] = [
+        _option_text(options.get(str(uuid)), int(option_id))
+        for uuid, option_id in zip(votes_df.loc[missing, "uuid"], ids[missing])
+    ]
+    return votes_df
+
+# ---------------------------------------------------------
+# 議題ごとの集計（uuid -> 選択肢ごとの票数）と投票者ごとの投票済み議題
+# ---------------------------------------------------------
+# 議題ごとに votes_df を絞り込むと「議題数 × 投票数」かかるので、
+# 読み込みのたびに一度だけ groupby して辞書にしておく。
+# 投票済みかどうかは「メールアドレス -> 投票した議題の uuid」の集合を1回引くだけで分かる。
+# 番号（option_id）のある票は bincount で数えて番号（int）をキーに、番号の無い票（自由記述・
+# 移行前の票）は文字列をキーにして持つ。番号を文字列に直すのは counts_for で表示するときだけ
+# （選択肢のキャッシュが古くても、集計に "#N" が残らない）。
+class VoteTally:
+    def __init__(self, votes_df=None):
+        self.counts = {}        # uuid -> {選択肢の番号 または 文字列: 票数}
+        self.voted_topics = {}  # 投票者のメールアドレス -> {投票した議題の uuid}
+        # copy() 後に自分用に複製したキー（None なら全部自分のもの）
+        self._owned_counts = None
+        self._owned_voters = None
+        if votes_df is not None:
+            self.add_frame(votes_df)
+
+    def copy(self):
+        # 外側の辞書だけ複製し、中身は書き換えるときに議題・投票者ごとに複製する
+        # （票が増えた議題・投票した人の分しかコピーしないので、全投票数に比例しない）
+        new = VoteTally()
+        new.counts = dict(self.counts)
+        new.voted_topics = dict(self.voted_topics)
+        new._owned_counts = set()
+        new._owned_voters = set()
+        return new
+
+    def _own(self, uuid):
+        if self._owned_counts is not None and uuid not in self._owned_counts:
+            self.counts[uuid] = dict(self.counts.get(uuid, {}))
+            self._owned_counts.add(uuid)
+
+    def _own_voter(self, email):
+        if self._owned_voters is not None and email not in self._owned_voters:
+            self.voted_topics[email] = set(self.voted_topics.get(email, ()))
+            self._owned_voters.add(email)
+
+    def add_frame(self, votes_df):
+        if votes_df.empty or not {"uuid", "option", "voted_email"}.issubset(votes_df.columns):
+            return
+        by_text = votes_df
+        if "option_id" in votes_df.columns:
+            has_id = votes_df["option_id"].to_numpy() >= 0
+            if has_id.any():
+                self._add_counts(_count_option_ids(votes_df[has_id]))
+                by_text = votes_df[~has_id]
+        if not by_text.empty:
+            # 番号の無い票（自由記述・移行前の票）：型は typed_votes でそろえてあるので、カテゴリのまま groupby する
+            sizes = by_text.groupby(["uuid", "option"], sort=False, observed=True).size()
+            self._add_counts(sizes.items())
+        voters = votes_df[["voted_email", "uuid"]].drop_duplicates()
+        for email, uuid in zip(voters["voted_email"], voters["uuid"]):
+            self._own_voter(email)
+            self.voted_topics.setdefault(email, set()).add(uuid)
+
+    def _add_counts(self, counts):
+        # counts: ((uuid, 選択肢の番号 または 文字列), 票数) の並び
+        for (uuid, option), size in counts:
+            self._own(uuid)
+            topic_counts = self.counts.setdefault(uuid, {})
+            topic_counts[option] = topic_counts.get(option, 0) + int(size)
+
+    def add(self, uuid, option, email, option_id=""):
+        uuid, email = str(uuid), normalize_email(email)
+        key = _count_key(option, option_id)
+        self._own(uuid)
+        topic_counts = self.counts.setdefault(uuid, {})
+        topic_counts[key] = topic_counts.get(key, 0) + 1
+        self._own_voter(email)
+        self.voted_topics.setdefault(email, set()).add(uuid)
+
+    def with_vote(self, uuid, option, email, option_id=""):
+        # 表示中の集計を書き換えないよう、コピーに足して返す
+        new = self.copy()
+        new.add(uuid, option, email, option_id)
+        return new
+
+    def with_votes(self, votes):
+        # votes: (uuid, 選択肢, メールアドレス[, option_id]) の並び。まだ入っていない票だけ足して返す
+        missing = [vote for vote in votes if not self.has_voted(vote[0], vote[2])]
+        if not missing:
+            return self
+        new = self.copy()
+        for vote in missing:
+            if not new.has_voted(vote[0], vote[2]):
+                new.add(*vote)
+        return new
+
+    def to_bytes(self):
+        # 共有キャッシュに置く形（票数と投票済みの人だけの JSON）。
+        # JSON のキーは文字列になるので、票数は [uuid, 番号 または 文字列, 票数] の並びで置く
+        return json.dumps({
+            "counts": [[uuid, key, n] for uuid, counts in self.counts.items() for key, n in counts.items()],
+            "voted_topics": {email: sorted(uuids) for email, uuids in self.voted_topics.items()},
+        }, ensure_ascii=False).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, data):
+        payload = json.loads(data)
+        tally = cls()
+        for uuid, key, n in payload["counts"]:
+            tally.counts.setdefault(uuid, {})[key] = int(n)
+        tally.voted_topics = {email: set(uuids) for email, uuids in payload["voted_topics"].items()}
+        return tally
+
+    def counts_for(self, uuid):
+        # 選択肢の文字列 -> 票数。票の多い順（value_counts と同じ並び）
+        topic_counts = self.counts.get(str(uuid), {})
+        texts = None
+        if any(isinstance(key, int) for key in topic_counts):
+            try:
+                texts = _topic_options().get(str(uuid))
+            except Exception as e:
+                logger.warning("選択肢を読み込めませんでした: %s", e)
+        labeled = {}
+        for key, n in topic_counts.items():
+            label = _option_text(texts, key) if isinstance(key, int) else key
+            labeled[label] = labeled.get(label, 0) + n
+        return dict(sorted(labeled.items(), key=lambda kv: -kv[1]))
+
+    def total_for(self, uuid):
+        return sum(self.counts.get(str(uuid), {}).values())
+
+    def topics_voted_by(self, email):
+        return frozenset(self.voted_topics.get(normalize_email(email), ()))
+
+    def has_voted(self, uuid, email):
+        return str(uuid) in self.voted_topics.get(normalize_email(email), ())
+
+    def voters_for(self, uuids):
+        # uuids の議題のどれかに投票した人のメールアドレスの集合
+        uuids = {str(uuid) for uuid in uuids}
+        return {email for email, topics in self.voted_topics.items() if not uuids.isdisjoint(topics)}
+
+
+def _count_key(option, option_id):
+    # 番号のある票は番号、無い票は選択肢の文字列で数える
+    if option_id not in ("", None) and int(option_id) >= 0:
+        return int(option_id)
+    return str(option)
+
+
+def _count_option_ids(votes_df):
+    # 議題の番号（uuid のカテゴリコード）と option_id から1つの整数を作り、bincount 1回で全議題分を数える
+    uuids = votes_df["uuid"].astype("category")
+    codes = uuids.cat.codes.to_numpy(np.int64)
+    option_ids = votes_df["option_id"].to_numpy(np.int64)
+    width = int(option_ids.max()) + 1
+    counts = np.bincount(codes * width + option_ids)
+    categories = uuids.cat.categories
+    for key in np.flatnonzero(counts):
+        yield (str(categories[key // width]), int(key % width)), counts[key]
+
+
+@metrics.instrument("get_vote_tally")
+def get_vote_tally():
+    tally = _cache.get("tally")
+    if tally is None:
+        if get_shared_cache() is not None:
+            return _single_flight.do("shared_tally", _load_shared_tally)
+        get_votes_from_sheet()
+        tally = _cache.get("tally") or VoteTally()
+    return tally
+
+
+# 保存先から読んだ投票（書き込み待ちを含まない）の集計。
+# 保存先が差分同期していれば、前回から増えた行だけを足す。
+_base_tally_lock = threading.Lock()
+_base_tally = {"generation": None, "rows": 0, "tally": VoteTally()}
+
+
+def _sync_base_tally(df, generation):
+    # 戻り値：(集計, 前回から増えた行)
+    with _base_tally_lock:
+        state = _base_tally
+        if generation is None or generation != state["generation"] or len(df) < state["rows"]:
+            # 全件読み直した（または差分同期しない保存先）なら作り直す
+            tally, new_rows = VoteTally(df), df
+        else:
+            new_rows = df.iloc[state["rows"]:]
+            # 表示中の集計を書き換えないようコピーに足す
+            tally = state["tally"].copy() if len(new_rows) else state["tally"]
+            tally.add_frame(new_rows)
+        state.update(generation=generation, rows=len(df), tally=tally)
+        return tally, new_rows
+
+
+def _load_votes():
+    backend = get_backend()
+    # 読み込み中に書き込みが終わっても票が消えないよう、先に控えておく
+    pending = _vote_queue.pending_rows()
+    df = backend.read_votes()
+    if df is None:
+        return None, None
+    df = typed_votes(df)
+
+    generation = getattr(backend, "votes_generation", None)
+    if generation is not None:
+        # 保存先を差し替えたときに前の保存先の続きとして足さないよう、保存先ごとに区別する
+        generation = (id(backend), generation)
+    tally, new_rows = _sync_base_tally(df, generation)
+    pending_df = _unwritten_votes(new_rows, pending)
+    if pending_df.empty:
+        return df, tally
+
+    pending_df = typed_votes(pending_df)
+    tally = tally.copy()
+    tally.add_frame(pending_df)
+    return typed_votes(pd.concat([df, pending_df], ignore_index=True)), tally
+
+# ---------------------------------------------------------
+# 投票の書き込み待ち行列（バックグラウンドでまとめて append_rows）
+# ---------------------------------------------------------
+# スプレッドシートに投票のたびに append_row すると、締め切り前の集中で書き込み制限(429)に当たる。
+# 投票は行列に積んですぐ返し、別スレッドが件数か時間でまとめて書き込む。
+# 書き込みが終わるまでの票も pending_rows() で読み込み結果に混ぜるので、
+# 二重投票チェックや票数には最初から反映される。
+class _VoteQueue:
+    def __init__(self, batch_size, flush_interval, retry_max_delay, max_attempts, dead_letter_path):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_max_delay = retry_max_delay
+        self.max_attempts = max_attempts
+        self.dead_letter_path = dead_letter_path
+        self._cond = threading.Condition()
+        self._pending = []     # まだ書き込んでいない票（VOTE_COLUMNS の dict）
+        self._in_flight = []   # 書き込み中の票
+        self._thread = None
+
+    def put(self, record):
+        with self._cond:
+            self._pending.append(record)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="vote-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def pending_rows(self):
+        with self._cond:
+            return self._in_flight + self._pending
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            # 最初の1票から flush_interval 待つ（その間に batch_size たまれば即書き込み）
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._pending) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.batch_size]
+            self._in_flight = batch
+            self._pending = self._pending[self.batch_size:]
+            return batch
+
+    def _write(self, batch):
+        # 書けていないと分かる一時的な失敗（429・接続できない等）だけ max_attempts 回まで再送する。
+        # 書けたか分からない失敗（5xx・応答待ちのタイムアウト）は再送すると票が二重になり、
+        # 再送しても通らない失敗（権限・値の誤りなど）は後ろの票まで止めるので、別に残して先へ進む
+        delay = 1.0
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                if get_backend().append_votes(batch):
+                    return
+                error = "保存先に接続できません"
+            except Exception as e:
+                if not get_backend().is_transient_error(e):
+                    self._dead_letter(batch, e)
+                    return
+                error = e
+            if attempt == self.max_attempts:
+                break
+            logger.warning("投票の書き込みに失敗しました（%d 件, %.0f 秒後に再送）: %s", len(batch), delay, error)
+            # 同時に再送が集中しないよう揺らぎを入れて待つ
+            time.sleep(delay + random.uniform(0, delay / 2))
+            delay = min(delay * 2, self.retry_max_delay)
+        self._dead_letter(batch, error)
+
+    def _dead_letter(self, batch, error):
+        # 書き込めなかった票を1行1票の JSON で追記する（後で確かめて手で入れ直せるように）
+        logger.error("投票 %d 件を書き込めませんでした（%s に残します）: %s", len(batch), self.dead_letter_path, error)
+        try:
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                for record in batch:
+                    f.write(json.dumps({"error": str(error), "vote": record}, ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            # ファイルにも書けなければ、ログにだけは票を残す
+            logger.error("%s に書き込めません: %s。票: %s", self.dead_letter_path, e, batch)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            self._write(batch)
+            with self._cond:
+                self._in_flight = []
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        # 待ち行列が空になるまで待つ（終了時用）
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._pending or self._in_flight:
+                if self._thread is None or not self._thread.is_alive():
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+
+_vote_queue = _VoteQueue(
+    VOTE_BATCH_SIZE, VOTE_FLUSH_INTERVAL, VOTE_RETRY_MAX_DELAY, VOTE_MAX_ATTEMPTS, VOTE_DEAD_LETTER_PATH
+)
+atexit.register(_vote_queue.flush, 30)
+
+
+def flush_votes(timeout=None):
+    return _vote_queue.flush(timeout)
+
+
+def _unwritten_votes(new_rows, pending):
+    # 書き込み待ちの票のうち、まだ保存先に無いもの
+    # （読み込み中に書き込みが終わった票は、今回増えた行の中にだけ現れる）
+    pending_df = pd.DataFrame(pending, columns=VOTE_COLUMNS)
+    if pending_df.empty or new_rows.empty or not set(VOTE_COLUMNS).issubset(new_rows.columns):
+        return pending_df
+    key = ["uuid", "voted_email", "voted_at"]
+    written = pd.MultiIndex.from_frame(new_rows[key].astype(str))
+    return pending_df[~pd.MultiIndex.from_frame(pending_df[key].astype(str)).isin(written)]
+
+def _now_jst():
+    t_delta = datetime.timedelta(hours=9)
+    JST = datetime.timezone(t_delta, 'JST')
+    return datetime.datetime.now(JST).strftime("%Y-%m-%d %H:%M:%S")
 
 # ---------------------------------------------------------
 # 1. 議題を保存する
 # ---------------------------------------------------------
+def _option_list(options):
+    # options: 選択肢のリスト、または "FREE_INPUT"（"/" 区切りの文字列も受け付ける）。
+    # 戻り値：選択肢のリスト（自由記述なら None）
+    if isinstance(options, str):
+        if options == "FREE_INPUT":
+            return None
+        options = options.split("/")
+    return [str(o).strip() for o in options if str(o).strip()]
+
+
+def _save_topics(records, option_lists):
+    # option_lists: records と同じ並びの選択肢のリスト（自由記述は None）。
+    # 選択肢を先に書く（議題だけが見えて選択肢が無い、という状態を作らない）
+    backend = get_backend()
+    new_options = {r["uuid"]: texts for r, texts in zip(records, option_lists) if texts}
+    option_rows = [
+        {"uuid": uuid, "option_id": i, "option": text}
+        for uuid, texts in new_options.items() for i, text in enumerate(texts)
+    ]
+    if option_rows and not backend.append_options(option_rows):
+        return False
+    # 議題は何件でも保存先への書き込みは1回
+    if not backend.append_topics(records):
+        return False
+    _cache.patch("options", lambda options: {**options, **new_options})
+    _append_cached_rows("topics", records)
+    _invalidate_shared("topics")
+    return True
+
+
+@metrics.instrument("add_topic")
 def add_topic_to_sheet(title, author, options, deadline, owner_email):
-    sheet = connect_to_sheet()
-    if sheet is None: return
-    
+    # options: 選択肢のリスト、または自由記述なら "FREE_INPUT"
     try:
-        worksheet = sheet.worksheet("topics")
-        t_delta = datetime.timedelta(hours=9)
-        JST = datetime.timezone(t_delta, 'JST')
-        created_at = datetime.datetime.now(JST).strftime("%Y-%m-%d %H:%M:%S")
-        
-        # タイトル, 作成者, 選択肢, 期限, 作成日, ステータス, 作成者メアド
-        new_row = [title, author, options, str(deadline), created_at, "active", owner_email]
-        
-        worksheet.append_row(new_row)
+        texts = _option_list(options)
+        record = {
+            "title": title,
+            "author": author,
+            # 選択肢は options の表に書く（"/" を含む選択肢が壊れないよう、列には並べない）
+            "options": "" if texts is not None else "FREE_INPUT",
+            "deadline": str(deadline),
+            "created_at": _now_jst(),
+            "status": "active",
+            "owner_email": normalize_email(owner_email),
+            "uuid": str(uuid_lib.uuid4()),
+        }
+        _save_topics([record], [texts])
     except Exception as e:
         st.error(f"書き込みエラー: {e}")
 
+
+@metrics.instrument("add_topics")
+def add_topics_to_sheet(topics_df, owner_email):
+    # topics_df: title / author / options / deadline の列を持つ表（topic_import.validate の結果。
+    # options は選択肢のリストか "FREE_INPUT"）。戻り値：作成した件数（書き込めなかったときは 0）
+    try:
+        if topics_df.empty:
+            return 0
+        option_lists = [_option_list(options) for options in topics_df["options"]]
+        records = topics_df.assign(
+            options=["" if texts is not None else "FREE_INPUT" for texts in option_lists],
+            created_at=_now_jst(),
+            status="active",
+            owner_email=normalize_email(owner_email),
+            uuid=[str(uuid_lib.uuid4()) for _ in range(len(topics_df))],
+        ).reindex(columns=TOPIC_COLUMNS, fill_value="").astype(str).to_dict("records")
+        return len(records) if _save_topics(records, option_lists) else 0
+    except Exception as e:
+        st.error(f"書き込みエラー: {e}")
+        return 0
+
 # ---------------------------------------------------------
 # 2. 議題を読み込む
 # ---------------------------------------------------------
-def get_topics_from_sheet():
-    sheet = connect_to_sheet()
-    if sheet is None: return pd.DataFrame()
-    
+@metrics.instrument("get_topics")
+def get_topics_from_sheet(raise_errors=False):
+    # raise_errors=True なら画面に出さずに例外を投げる（スクリプトの実行の外から呼ぶとき用）
     try:
-        worksheet = sheet.worksheet("topics")
-        data = worksheet.get_all_records()
-        return pd.DataFrame(data)
+        return _read_records("topics")
     except Exception as e:
+        if raise_errors:
+            raise
         st.error(f"読み込みエラー: {e}")
         return pd.DataFrame()
 
 # ---------------------------------------------------------
-# 3. 投票を保存する（ここを更新！）
+# 3. 投票を保存する
 # ---------------------------------------------------------
-# 引数に user_email を追加しました
-def add_vote_to_sheet(topic_title, option, user_email,uuid):
-    sheet = connect_to_sheet()
-    if sheet is None: return
-    
+# 同じ人の投票が同時に届いても二重に受け付けないよう、投票済みの確認と手元の集計への反映だけを
+# _vote_lock の中で行う。保存先・共有キャッシュの読み書きはロックの外で行い、書き込み中の票は
+# _voting（(uuid, メールアドレス) の集合）で押さえておく（1人の通信待ちで全員を待たせない）
+_vote_lock = threading.Lock()
+_voting = set()
+
+
+@metrics.instrument("add_vote")
+def add_vote_to_sheet(topic_title, option, user_email, uuid):
+    # 受け付けたら True（投票済み・書き込めなかったときは False）
     try:
-        worksheet = sheet.worksheet("votes")
-        t_delta = datetime.timedelta(hours=9)
-        JST = datetime.timezone(t_delta, 'JST')
-        voted_at = datetime.datetime.now(JST).strftime("%Y-%m-%d %H:%M:%S")
-        
-        # ▼▼▼ 最後に user_email を保存します ▼▼▼
-        new_row = [topic_title, option, voted_at, user_email,uuid]
-        
-        worksheet.append_row(new_row)
+        record = {
+            "topic_title": topic_title,
+            "option": option,
+            "voted_at": _now_jst(),
+            "voted_email": normalize_email(user_email),
+            "uuid": str(uuid),
+            # 選択肢の番号（自由記述・移行前の議題は空）。保存先は番号があれば文字列を省く
+            "option_id": _option_id(uuid, option),
+        }
+        # 集計の読み込み（保存先を読むことがある）はロックの外で済ませる
+        tally = get_vote_tally()
+        key = (str(uuid), record["voted_email"])
+        with _vote_lock:
+            # 集計には書き込み待ちの票も入っているので、シートを読み直さずに二重投票を断れる
+            current = _cache.get("tally") or tally
+            if key in _voting or current.has_voted(uuid, user_email):
+                st.warning("⚠️ この議題には既に投票しています。")
+                return False
+            _voting.add(key)
+        try:
+            if get_backend().batch_writes:
+                # 書き込みはバックグラウンドでまとめて行う
+                _vote_queue.put(record)
+            elif not get_backend().append_votes([record]):
+                return False
+            with _vote_lock:
+                # ロックの中では集計（書き換えた議題・投票者の分だけコピーする）だけを直す。
+                # 投票の表は票のたびに全体をつなぎ直すと重いので捨て、次に読むときに差分同期で作り直す
+                _cache.patch("tally", lambda tally: tally.with_vote(uuid, option, user_email, record["option_id"]))
+                _cache.invalidate("votes")
+        finally:
+            with _vote_lock:
+                _voting.discard(key)
+        # 他のレプリカの集計にもすぐ入るよう、共有の投票ログに足す
+        _share_vote(record)
+        return True
     except Exception as e:
         st.error(f"投票書き込みエラー: {e}")
+        return False
 
 # ---------------------------------------------------------
 # 4. 投票数を集計する
 # ---------------------------------------------------------
+@metrics.instrument("get_votes")
 def get_votes_from_sheet():
-    sheet = connect_to_sheet()
-    if sheet is None: return pd.DataFrame()
-    
     try:
-        worksheet = sheet.worksheet("votes")
-        data = worksheet.get_all_records()
-        return pd.DataFrame(data)
+        return _read_records("votes")
     except Exception as e:
         st.error(f"投票読み込みエラー: {e}")
         return pd.DataFrame()
@@ -118,55 +955,219 @@ def get_votes_from_sheet():
 #---------------------------------------------------------
 #    議題の論理削除
 #---------------------------------------------------------
+@metrics.instrument("delete_topic")
 def delete_topic_by_uuid(uuid, owner_email):
-    sheet = connect_to_sheet()
-    if sheet is None:
+    try:
+        deleted = get_backend().update_topic_status(uuid, "deleted", owner_email=owner_email)
+        if deleted:
+            _set_cached_status(uuid, "deleted")
+            _invalidate_shared("topics")
+        return deleted
+    except Exception as e:
+        st.error(f"削除エラー: {e}")
         return False
 
+
+def get_topic_status(uuid):
+    # 議題カードを描き直すとき用：議題一覧をコピーせずに1件の status だけ引く
+    df = _cache.get("topics")
+    if df is None:
+        df = get_topics_from_sheet()
+    if df.empty:
+        return None
+    match = df.loc[df["uuid"] == str(uuid), "status"]
+    return str(match.iloc[0]) if len(match) else None
+
+
+# ---------------------------------------------------------
+# 5. ステータスを終了にする
+# ---------------------------------------------------------
+@metrics.instrument("close_topic")
+def close_topic_status(uuid):
     try:
-        worksheet = sheet.worksheet("topics")
-        records = worksheet.get_all_records()
-        df = pd.DataFrame(records)
+        if get_backend().update_topic_status(uuid, "closed"):
+            _set_cached_status(uuid, "closed")
+            _invalidate_shared("topics")
+    except Exception as e:
+        st.error(f"ステータス更新エラー: {e}")
 
-        target = df[
-            (df["uuid"] == uuid) &
-            (df["owner_email"] == owner_email)
-        ]
 
-        if target.empty:
-            return False
+# ---------------------------------------------------------
+# 変更の確認（自動更新用）
+# ---------------------------------------------------------
+# 自動更新のたびに全件を読み直すと、見ている人数 × 回数だけ読み込みが増える。
+# 代わりに保存先の data_version()（スプレッドシートなら最終更新日時）だけを
+# LIVE_CHECK_INTERVAL 秒に1回確かめ、変わっていたときだけキャッシュを捨てて読み直させる。
+_version_lock = threading.Lock()
+_version_state = {"checked_at": None, "version": None}
 
-        row_number = target.index[0] + 2  # ヘッダー分
 
-        # status 列（6列目）を deleted に
-        worksheet.update_cell(row_number, 6, "deleted")
-        return True
+def _check_version():
+    with _version_lock:
+        checked_at = _version_state["checked_at"]
+        if checked_at is not None and time.monotonic() - checked_at < LIVE_CHECK_INTERVAL:
+            return _version_state["version"]
+
+    version = get_backend().data_version()
+    with _version_lock:
+        previous = _version_state["version"]
+        _version_state.update(checked_at=time.monotonic(), version=version)
+    if previous is not None and version != previous:
+        # 手元のキャッシュだけ捨てる。共有キャッシュは書き込んだレプリカが世代を進めているので、
+        # ここで捨てると投票のたびに全レプリカが保存先を読み直すことになる
+        for key in ("topics", "options", "votes", "tally"):
+            _cache.invalidate(key)
+    return version
+
 
+@metrics.instrument("check_for_changes")
+def check_for_changes():
+    # 戻り値：データのバージョン（確かめられなければ前回の値）。
+    # 前回から変わっていたら、次の読み込みで保存先から読み直す
+    try:
+        return _single_flight.do("data_version", _check_version)
     except Exception as e:
-        st.error(f"削除エラー: {e}")
-        return False
+        logger.warning("変更の確認に失敗しました: %s", e)
+        return _version_state["version"]
 
 
 # ---------------------------------------------------------
-# 5. ステータスを終了にする
+# 6. 終わった議題のアーカイブ
 # ---------------------------------------------------------
-def close_topic_status(topic_title):
+# 終了・削除・締め切り済みの議題が残り続けると、一覧の読み込みのたびに
+# それらも全部読むことになる。締め切りから ARCHIVE_RETENTION_DAYS 日たった議題は
+# 投票ごとアーカイブへ移し、普段の読み込みは進行中の分だけにする。
+# アーカイブは投票結果ページで「アーカイブも表示」を選んだときだけ読む。
+def find_archivable_topics(topics_df, retention_days=None, now=None):
+    # 戻り値：アーカイブしてよい議題の uuid のリスト
+    if topics_df.empty:
+        return []
+    retention_days = ARCHIVE_RETENTION_DAYS if retention_days is None else retention_days
+    now = pd.Timestamp.now(tz="Asia/Tokyo").tz_localize(None) if now is None else now
+
+    # 締め切りが無い議題は作成日時から数える
+    created_at = pd.to_datetime(topics_df["created_at"], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+    ended_at = topics_df["deadline"].fillna(created_at)
+    finished = topics_df["status"].isin(["closed", "deleted"]) | (topics_df["deadline"] < now)
+    old_enough = ended_at < now - pd.Timedelta(days=retention_days)
+    return topics_df.loc[finished & old_enough & (topics_df["uuid"] != ""), "uuid"].astype(str).tolist()
+
+
+@metrics.instrument("archive_topics")
+def archive_finished_topics(retention_days=None, dry_run=False):
+    # 戻り値：アーカイブした（dry_run なら対象の）議題の uuid のリスト
+    # 書き込み待ちの票を先に書いておく（移した後に元のシートへ書かれないように）
+    flush_votes()
+    topics_df = get_backend().read_topics()
+    if topics_df is None:
+        return []
+    uuids = find_archivable_topics(typed_topics(topics_df), retention_days)
+    if dry_run or not uuids:
+        return uuids
+
+    archived = get_backend().archive_topics(uuids)
+    clear_cache()
+    _invalidate_shared("topics", "tally")
+    return archived
+
+
+@metrics.instrument("get_archived_topics")
+def get_archived_topics(raise_errors=False):
     try:
-        sheet = connect_to_sheet()
-        if sheet is None: return
-
-        worksheet = sheet.worksheet("topics")
-        cell = worksheet.find(topic_title)
-        # F列(6列目)を closed に書き換える
-        worksheet.update_cell(cell.row, 6, "closed")
-        
+        return _read_records("archived_topics")
     except Exception as e:
-        st.error(f"ステータス更新エラー: {e}")
+        if raise_errors:
+            raise
+        st.error(f"アーカイブ読み込みエラー: {e}")
+        return typed_topics(pd.DataFrame())
+
+
+@metrics.instrument("get_archived_vote_tally")
+def get_archived_vote_tally():
+    tally = _cache.get("archived_tally")
+    if tally is None:
+        try:
+            _read_records("archived_votes")
+        except Exception as e:
+            st.error(f"アーカイブ読み込みエラー: {e}")
+        tally = _cache.get("archived_tally") or VoteTally()
+    return tally
+
+
+# ---------------------------------------------------------
+# 7. 選択肢の表への移行（1回だけ実行する）
+# ---------------------------------------------------------
+# 今までの議題は選択肢を options 列に "/" 区切りで持ち、票は選択肢の文字列で持っていた。
+# options の表に無い議題の選択肢を表に書き、番号の無い票に option_id を付けて文字列を消す。
+# 何度実行しても、移行済みの議題・票はそのまま（途中で止まっても続きから）。
+# アーカイブ済みの議題・票も同じように移す（選択肢の表はアーカイブへ移さない）。
+def _missing_option_rows(topics_df, options):
+    rows = []
+    for uuid, raw in zip(topics_df["uuid"].astype(str), topics_df["options"].astype(str)):
+        if uuid == "" or uuid in options or raw in ("", "FREE_INPUT"):
+            continue
+        # 今までの票の文字列と突き合わせるので、前後の空白も含めて画面に出していたとおりに区切る
+        texts = [t for t in raw.split("/") if t.strip()]
+        # 同じ文字列の選択肢が2つあっても、票の文字列からは区別できないので1つにする
+        texts = list(dict.fromkeys(texts))
+        options[uuid] = texts
+        rows += [{"uuid": uuid, "option_id": i, "option": text} for i, text in enumerate(texts)]
+    return rows
 
 
+def _vote_option_ids(votes_df, options):
+    # 戻り値：(書き換え後の option のリスト, option_id のリスト, 番号を付けた票の数)
+    votes_df = votes_df.reindex(columns=VOTE_COLUMNS).fillna("").astype(str)
+    lookup = pd.DataFrame(
+        [(uuid, text, i) for uuid, texts in options.items() for i, text in enumerate(texts) if text is not None],
+        columns=["uuid", "option", "new_id"],
+    ).drop_duplicates(["uuid", "option"])
+    merged = votes_df[["uuid", "option", "option_id"]].merge(lookup, on=["uuid", "option"], how="left")
+    convert = (merged["option_id"] == "") & merged["new_id"].notna()
+    option_ids = merged["option_id"].where(~convert, merged["new_id"].astype("Int64").astype(str))
+    texts = merged["option"].where(~convert, "")
+    return texts.tolist(), option_ids.tolist(), int(convert.sum())
 
 
+def _backup_votes(votes_df, backup_dir, name):
+    # 書き換える前の投票を CSV に残す（移行がおかしかったときに手で戻せるように）。戻り値：ファイルのパス
+    os.makedirs(backup_dir, exist_ok=True)
+    path = os.path.join(backup_dir, f"{name}_{time.strftime('%Y%m%d_%H%M%S')}.csv")
+    votes_df.to_csv(path, index=False, encoding="utf-8-sig")
+    return path
 
 
+@metrics.instrument("migrate_options")
+def migrate_options(dry_run=False, backup_dir=None):
+    # backup_dir を渡すと、票を書き換える前の votes / votes_archive をそこに CSV で残す。
+    # 戻り値：{"options": 書いた選択肢の行数, "votes": 番号を付けた票, "archived_votes": 同（アーカイブ）,
+    #          "backups": 残した CSV のパスのリスト}
+    flush_votes()
+    backend = get_backend()
+    options = _option_lists(backend.read_options())
+    topics_df = pd.concat(
+        [df for df in (backend.read_topics(), backend.read_archived_topics()) if df is not None and not df.empty]
+        or [pd.DataFrame(columns=TOPIC_COLUMNS)],
+        ignore_index=True,
+    )
+    option_rows = _missing_option_rows(topics_df.reindex(columns=TOPIC_COLUMNS).fillna(""), options)
+    if option_rows and not dry_run:
+        backend.append_options(option_rows)
+    result = {"options": len(option_rows), "backups": []}
 
+    for key, archived in (("votes", False), ("archived_votes", True)):
+        votes_df = backend.read_archived_votes() if archived else backend.read_votes()
+        if votes_df is None or votes_df.empty:
+            result[key] = 0
+            continue
+        texts, option_ids, converted = _vote_option_ids(votes_df, options)
+        if converted and not dry_run:
+            if backup_dir is not None:
+                result["backups"].append(_backup_votes(votes_df, backup_dir, key))
+            backend.replace_vote_options(texts, option_ids, archived=archived)
+        result[key] = converted
 
+    if not dry_run:
+        clear_cache()
+        _invalidate_shared("topics", "tally")
+    return result
@@ -0,0 +1,189 @@
+import argparse
+import io
+import sys
+from collections import Counter
+import pandas as pd
+import db_handler
+from settings import get_setting
+from storage import get_backend, normalize_email, VOTE_COLUMNS
+
+# ---------------------------------------------------------
+# 投票結果の書き出し（CSV / Parquet）
+# ---------------------------------------------------------
+# 投票シートを丸ごと読み込まず、保存先から EXPORT_CHUNK_ROWS 行ずつ読んでは
+# 絞り込んで書き出す。メモリに載るのは常に1かたまり分だけ。
+#   votes : 投票の明細（1票1行）
+#   tally : 議題・選択肢ごとの票数
+# 作成者（owner）と投票日時の範囲で絞り込める。
+# 投票結果ページの「書き出し」と、下のコマンドの両方から使う。
+#   python export.py votes --format csv -o votes.csv --owner someone@example.com
+#   python export.py tally --format parquet -o tally.parquet --since 2025-04-01 --archive
+
+EXPORT_CHUNK_ROWS = get_setting("export", "chunk_rows", 5000)
+VOTED_AT_FORMAT = "%Y-%m-%d %H:%M:%S"
+TALLY_COLUMNS = ["uuid", "title", "owner_email", "deadline", "option", "votes"]
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+def _topics(owner_email, include_archive):
+    # 読めなかったときに空のまま書き出さないよう、エラーは呼び出し元へ投げる
+    topics_df = db_handler.get_topics_from_sheet(raise_errors=True)
+    if include_archive:
+        topics_df = db_handler.typed_topics(
+            pd.concat([topics_df, db_handler.get_archived_topics(raise_errors=True)], ignore_index=True)
+        )
+    if owner_email is not None:
+        topics_df = topics_df[topics_df["owner_email"] == normalize_email(owner_email)]
+    return topics_df
+
+
+def iter_votes(owner_email=None, since=None, until=None, include_archive=False, chunk_rows=None):
+    # 条件に合う投票を DataFrame のかたまりで順に返す（since 以上・until 未満）
+    uuids = None
+    if owner_email is not None:
+        uuids = set(_topics(owner_email, include_archive)["uuid"].astype(str))
+    # 投票日時は固定幅の文字列なので、日時に直さず文字列のまま比べる
+    since = pd.Timestamp(since).strftime(VOTED_AT_FORMAT) if since is not None else None
+    until = pd.Timestamp(until).strftime(VOTED_AT_FORMAT) if until is not None else None
+
+    # 書き込み待ちの票も含めるよう先に書いておく
+    db_handler.flush_votes(timeout=30)
+    backend = get_backend()
+    for archived in ([False, True] if include_archive else [False]):
+        for chunk in backend.iter_votes(chunk_rows or EXPORT_CHUNK_ROWS, archived=archived):
+            # 書き出すかたまりごとに列と型をそろえる（Parquet はかたまり間で型が同じ必要がある）
+            chunk = chunk.reindex(columns=VOTE_COLUMNS).fillna("").astype(str)
+            mask = pd.Series(True, index=chunk.index)
+            if uuids is not None:
+                mask &= chunk["uuid"].isin(uuids)
+            if since is not None:
+                mask &= chunk["voted_at"] >= since
+            if until is not None:
+                mask &= chunk["voted_at"] < until
+            if mask.any():
+                # 選択肢の番号だけの票に選択肢の文字列を入れる
+                yield db_handler.with_option_text(chunk[mask])
+
+
+def tally_frame(owner_email=None, since=None, until=None, include_archive=False, chunk_rows=None):
+    # かたまりごとに数えて足し合わせる（結果は議題数 × 選択肢数の大きさ）
+    counts = Counter()
+    for chunk in iter_votes(owner_email, since, until, include_archive, chunk_rows):
+        for (uuid, option), size in chunk.groupby(["uuid", "option"], sort=False).size().items():
+            counts[(uuid, option)] += int(size)
+
+    topics_df = _topics(owner_email, include_archive)
+    topics = {str(row.uuid): row for row in topics_df.itertuples(index=False)}
+    rows = []
+    for (uuid, option), votes in sorted(counts.items()):
+        topic = topics.get(uuid)
+        rows.append({
+            "uuid": uuid,
+            "title": topic.title if topic is not None else "",
+            "owner_email": topic.owner_email if topic is not None else "",
+            "deadline": topic.deadline.strftime(db_handler.DEADLINE_FORMAT)
+            if topic is not None and pd.notna(topic.deadline) else "",
+            "option": option,
+            "votes": votes,
+        })
+    return pd.DataFrame(rows, columns=TALLY_COLUMNS)
+
+
+# ---------------------------------------------------------
+# 書き出し先（かたまりごとに追記する）
+# ---------------------------------------------------------
+class _CsvWriter:
+    def __init__(self, binary_file):
+        # Excel で開いても文字化けしないよう BOM 付き UTF-8
+        self._file = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+        self._header = True
+
+    def write(self, df):
+        df.to_csv(self._file, header=self._header, index=False)
+        self._header = False
+
+    def close(self):
+        self._file.flush()
+        self._file.detach()
+
+
+class _ParquetWriter:
+    def __init__(self, binary_file):
+        try:
+            import pyarrow  # noqa: F401
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise RuntimeError("Parquet で書き出すには pyarrow をインストールしてください。")
+        self._file = binary_file
+        self._writer = None
+
+    def write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self._file, table.schema)
+        self._writer.write_table(table.cast(self._writer.schema))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+_WRITERS = {"csv": _CsvWriter, "parquet": _ParquetWriter}
+
+
+def export(kind, fmt, binary_file, owner_email=None, since=None, until=None,
+           include_archive=False, chunk_rows=None):
+    # binary_file に書き出し、書いた行数を返す
+    if fmt not in _WRITERS:
+        raise ValueError(f"不明な形式です: {fmt}")
+    writer = _WRITERS[fmt](binary_file)
+    written = 0
+    try:
+        if kind == "votes":
+            chunks = iter_votes(owner_email, since, until, include_archive, chunk_rows)
+            empty = pd.DataFrame(columns=VOTE_COLUMNS)
+        elif kind == "tally":
+            chunks = [tally_frame(owner_email, since, until, include_archive, chunk_rows)]
+            empty = pd.DataFrame(columns=TALLY_COLUMNS)
+        else:
+            raise ValueError(f"不明な書き出し内容です: {kind}")
+
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            writer.write(chunk)
+            written += len(chunk)
+        if written == 0:
+            # 1件も無くても列名だけは書いておく
+            writer.write(empty.astype(str))
+    finally:
+        writer.close()
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="投票の明細・集計を CSV / Parquet で書き出す")
+    parser.add_argument("kind", choices=["votes", "tally"], help="votes: 投票の明細 / tally: 議題・選択肢ごとの票数")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("-o", "--output", required=True, help="書き出すファイル（- なら標準出力）")
+    parser.add_argument("--owner", help="この作成者の議題だけ")
+    parser.add_argument("--since", help="この日時以降の投票だけ（例: 2025-04-01）")
+    parser.add_argument("--until", help="この日時より前の投票だけ")
+    parser.add_argument("--archive", action="store_true", help="アーカイブ済みの議題・投票も含める")
+    parser.add_argument("--chunk-rows", type=int, default=None, help=f"一度に読む行数（省略時 {EXPORT_CHUNK_ROWS}）")
+    args = parser.parse_args(argv)
+
+    options = dict(owner_email=args.owner, since=args.since, until=args.until,
+                   include_archive=args.archive, chunk_rows=args.chunk_rows)
+    if args.output == "-":
+        written = export(args.kind, args.format, sys.stdout.buffer, **options)
+    else:
+        with open(args.output, "wb") as f:
+            written = export(args.kind, args.format, f, **options)
+    print(f"{written} 行を書き出しました。", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
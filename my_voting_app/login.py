@@ -0,0 +1,114 @@
+import os
+import re
+import json
+import time
+import threading
+from settings import get_setting
+
+# ---------------------------------------------------------
+# Googleログインの設定と ID トークンの検証（プロセス内で使い回す）
+# ---------------------------------------------------------
+# Home.py は再実行のたびに読み直されるので、ここ（import されるモジュール）に置く。
+#   - client_secret.json / Secrets の JSON は1回だけ読む（ファイルは更新されたら読み直す）
+#   - ID トークンの検証に使う Google の公開鍵は、応答の Cache-Control の期限まで使い回す
+#     （会議の始めに大勢が同時にログインしても、鍵の取得は1回で済む）
+# google_auth_oauthlib・google.auth・requests は読み込みに時間がかかるので、
+# ログイン画面を出すとき・ログインを確かめるときに初めて読み込む。
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CLIENT_SECRETS_FILE = os.path.join(BASE_DIR, "client_secret.json")
+SCOPES = ['openid', 'https://www.googleapis.com/auth/userinfo.email']
+
+# Secrets の [auth] redirect_uri があれば Cloud 用の URL を使う
+REDIRECT_URI = get_setting("auth", "redirect_uri", "http://localhost:8501")
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+# Cache-Control が無いときに公開鍵を使い回す時間（秒）
+DEFAULT_CERTS_MAX_AGE = 3600
+
+_config_lock = threading.Lock()
+_config = {"source": None, "value": None}    # 読み込んだ設定とその出どころ
+_certs_lock = threading.Lock()
+_certs = {"value": None, "expires_at": 0.0}  # 鍵ID -> 証明書
+_session = None                              # 鍵の取得で接続を使い回す（requests.Session）
+
+
+def _read_client_secrets_file():
+    with open(CLIENT_SECRETS_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_client_config():
+    # 戻り値：OAuth クライアントの設定（dict）。どちらにも無ければ None
+    if os.path.exists(CLIENT_SECRETS_FILE):
+        # 1. PCにファイルがあれば使う（ローカル用）
+        source = ("file", os.path.getmtime(CLIENT_SECRETS_FILE))
+        read = _read_client_secrets_file
+    else:
+        # 2. ファイルがないなら Secrets の [auth] client_secret_json（Cloud用）
+        secret_json = get_setting("auth", "client_secret_json", "")
+        if not secret_json:
+            return None
+        source = ("secrets", secret_json)
+        read = lambda: json.loads(secret_json)
+
+    with _config_lock:
+        if _config["source"] != source:
+            _config["value"] = read()
+            _config["source"] = source
+        return _config["value"]
+
+
+def new_flow():
+    # Flow はログインの途中経過を持つので毎回作る（設定の読み込みは1回だけ）
+    client_config = load_client_config()
+    if client_config is None:
+        return None
+    import google_auth_oauthlib.flow
+    return google_auth_oauthlib.flow.Flow.from_client_config(
+        client_config,
+        scopes=SCOPES,
+        redirect_uri=REDIRECT_URI
+    )
+
+
+def _max_age(headers):
+    # Cache-Control: public, max-age=19204 から、あと何秒使えるか（Age の分を引く）
+    match = re.search(r"max-age=(\d+)", headers.get("Cache-Control", ""))
+    if match is None:
+        return DEFAULT_CERTS_MAX_AGE
+    return max(0, int(match.group(1)) - int(headers.get("Age", 0) or 0))
+
+
+def google_certs(force_refresh=False):
+    global _session
+    # 取得中に来たほかのログインは、取得が終わるのを待って同じ鍵を使う
+    with _certs_lock:
+        if not force_refresh and _certs["value"] is not None and time.monotonic() < _certs["expires_at"]:
+            return _certs["value"]
+        if _session is None:
+            import requests
+            _session = requests.Session()
+        response = _session.get(GOOGLE_CERTS_URL, timeout=10)
+        response.raise_for_status()
+        _certs["value"] = response.json()
+        _certs["expires_at"] = time.monotonic() + _max_age(response.headers)
+        return _certs["value"]
+
+
+def verify_id_token(token, client_id):
+    # id_token.verify_oauth2_token と同じ確認を、使い回しの鍵で行う
+    from google.auth import exceptions, jwt
+    certs = google_certs()
+    key_id = jwt.decode_header(token).get("kid")
+    if key_id and key_id not in certs:
+        # 期限内でも Google が鍵を入れ替えていることがあるので、知らない鍵なら取り直す
+        certs = google_certs(force_refresh=True)
+
+    id_info = jwt.decode(token, certs=certs, audience=client_id)
+    if id_info.get("iss") not in GOOGLE_ISSUERS:
+        raise exceptions.GoogleAuthError(
+            f"Wrong issuer. 'iss' should be one of the following: {GOOGLE_ISSUERS}"
+        )
+    return id_info
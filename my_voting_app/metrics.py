@@ -0,0 +1,269 @@
+import threading
+import time
+import itertools
+import functools
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from settings import get_setting
+
+# ---------------------------------------------------------
+# 読み書きの計測（呼び出し回数・所要時間・行数・エラー/429）
+# ---------------------------------------------------------
+# db_handler の各操作と、スプレッドシートAPIの1回1回の呼び出しを記録する。
+# 記録は「どのページの、どの再実行から呼ばれたか」で分けて集計し、
+# 診断ページ（pages/4_診断.py）での表示と Prometheus 形式での書き出しに使う。
+
+# 所要時間のヒストグラムの区切り（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 診断ページに残す再実行の件数
+MAX_RECENT_RERUNS = get_setting("metrics", "recent_reruns", 200)
+
+_lock = threading.Lock()
+_stats = {}                    # (操作名, ページ) -> _Stat
+_reruns = OrderedDict()        # 再実行ID -> その再実行での合計
+_rerun_ids = itertools.count(1)
+# セッションID -> (実行中のページ, 再実行ID)。ボタンの on_click や @st.fragment の再実行は
+# ページ本体とは別のスレッドで動くので、スレッドではなく Streamlit のセッションで引く
+_sessions = OrderedDict()
+_MAX_SESSIONS = 1000
+
+
+class _Stat:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def add(self, seconds, rows, error):
+        self.calls += 1
+        self.rows += rows
+        self.seconds += seconds
+        if error is not None:
+            self.errors += 1
+            if _status_code(error) == 429:
+                self.rate_limited += 1
+        for i, upper in enumerate(LATENCY_BUCKETS):
+            if seconds <= upper:
+                self.buckets[i] += 1
+
+
+def _status_code(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def _session_id():
+    # Streamlit のスクリプト実行（ページ本体・コールバック・フラグメント）の中ならセッションID
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        return None
+    return ctx.session_id if ctx is not None else None
+
+
+def begin_page(page_name):
+    # 各ページの先頭で呼ぶ。以降このセッションの記録（コールバック・フラグメントを含む）に
+    # ページ名と再実行IDが付く
+    session_id = _session_id()
+    rerun_id = next(_rerun_ids)
+    with _lock:
+        if session_id is not None:
+            _sessions[session_id] = (page_name, rerun_id)
+            _sessions.move_to_end(session_id)
+            while len(_sessions) > _MAX_SESSIONS:
+                _sessions.popitem(last=False)
+        _reruns[rerun_id] = {
+            "rerun": rerun_id,
+            "session": (session_id or "")[:8],
+            "page": page_name,
+            "started_at": time.strftime("%H:%M:%S"),
+            "operations": 0,
+            "api_calls": 0,
+            "rows": 0,
+            "seconds": 0.0,
+            "errors": 0,
+        }
+        while len(_reruns) > MAX_RECENT_RERUNS:
+            _reruns.popitem(last=False)
+
+
+def _current():
+    # 戻り値：(ページ, 再実行ID)。バックグラウンドのスレッド（投票の書き込みなど）は "background"
+    session_id = _session_id()
+    with _lock:
+        return _sessions.get(session_id, ("background", None))
+
+
+def current_page():
+    return _current()[0]
+
+
+def record(operation, seconds, rows=0, error=None, api=False):
+    page, rerun_id = _current()
+    with _lock:
+        stat = _stats.get((operation, page))
+        if stat is None:
+            stat = _stats[(operation, page)] = _Stat()
+        stat.add(seconds, rows, error)
+
+        rerun = _reruns.get(rerun_id)
+        if rerun is not None:
+            rerun["api_calls" if api else "operations"] += 1
+            if api:
+                rerun["rows"] += rows
+                rerun["seconds"] += seconds
+            if error is not None:
+                rerun["errors"] += 1
+
+
+class _Tracker:
+    def __init__(self):
+        self.rows = 0
+
+
+@contextmanager
+def track(operation, api=False):
+    # with track("get_topics") as t: ...; t.rows = 件数
+    tracker = _Tracker()
+    start = time.perf_counter()
+    try:
+        yield tracker
+    except Exception as e:
+        record(operation, time.perf_counter() - start, tracker.rows, error=e, api=api)
+        raise
+    record(operation, time.perf_counter() - start, tracker.rows, api=api)
+
+
+def count_rows(result):
+    # API の戻り値から受け渡した行数を数える
+    if result is None:
+        return 0
+    if hasattr(result, "shape"):
+        return int(result.shape[0])
+    if isinstance(result, list):
+        if result and isinstance(result[0], list) and result[0] and isinstance(result[0][0], list):
+            return sum(len(r) for r in result)  # batch_get（範囲ごとの行のリスト）
+        return len(result)
+    return 1 if isinstance(result, (str, int, float)) else 0
+
+
+def instrument(operation):
+    # db_handler の関数用デコレータ（戻り値の DataFrame の行数も記録する）
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(operation) as tracker:
+                result = func(*args, **kwargs)
+                tracker.rows = count_rows(result)
+                return result
+        return wrapper
+    return decorator
+
+
+# ---------------------------------------------------------
+# 集計結果の取り出し
+# ---------------------------------------------------------
+def snapshot():
+    with _lock:
+        rows = []
+        for (operation, page), stat in sorted(_stats.items()):
+            rows.append({
+                "operation": operation,
+                "page": page,
+                "calls": stat.calls,
+                "errors": stat.errors,
+                "rate_limited": stat.rate_limited,
+                "rows": stat.rows,
+                "total_seconds": round(stat.seconds, 4),
+                "avg_ms": round(stat.seconds / stat.calls * 1000, 2) if stat.calls else 0.0,
+            })
+        return rows
+
+
+def recent_reruns():
+    with _lock:
+        return [dict(r, seconds=round(r["seconds"], 4)) for r in reversed(_reruns.values())]
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _reruns.clear()
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text():
+    lines = []
+    with _lock:
+        items = sorted(_stats.items())
+        counters = [
+            ("voting_app_calls_total", "呼び出し回数", "calls"),
+            ("voting_app_errors_total", "エラーになった呼び出し", "errors"),
+            ("voting_app_rate_limited_total", "429 (Too Many Requests) で失敗した呼び出し", "rate_limited"),
+            ("voting_app_rows_total", "受け渡した行数", "rows"),
+        ]
+        for name, help_text, attr in counters:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for (operation, page), stat in items:
+                labels = f'operation="{_label(operation)}",page="{_label(page)}"'
+                lines.append(f"{name}{{{labels}}} {getattr(stat, attr)}")
+
+        name = "voting_app_latency_seconds"
+        lines.append(f"# HELP {name} 所要時間")
+        lines.append(f"# TYPE {name} histogram")
+        for (operation, page), stat in items:
+            labels = f'operation="{_label(operation)}",page="{_label(page)}"'
+            # stat.buckets は区切りごとの累積数（その区切り以下に収まった回数）
+            for upper, count in zip(LATENCY_BUCKETS, stat.buckets):
+                lines.append(f'{name}_bucket{{{labels},le="{upper}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {stat.calls}')
+            lines.append(f"{name}_sum{{{labels}}} {stat.seconds}")
+            lines.append(f"{name}_count{{{labels}}} {stat.calls}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------------
+# Prometheus から取りに来られるようにする（[metrics] port を設定したときだけ）
+# ---------------------------------------------------------
+_server = None
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_exporter():
+    global _server
+    port = get_setting("metrics", "port", 0)
+    if not port:
+        return
+    with _lock:
+        if _server is not None:
+            return
+        try:
+            _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+        except OSError:
+            # 同じポートを別のプロセスが使っている
+            return
+    threading.Thread(target=_server.serve_forever, name="metrics-exporter", daemon=True).start()
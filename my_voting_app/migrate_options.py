@@ -0,0 +1,31 @@
+import argparse
+import db_handler
+
+# ---------------------------------------------------------
+# 選択肢の表への移行（1回だけ実行する）
+# ---------------------------------------------------------
+# 使い方（my_voting_app ディレクトリで）:
+#   python migrate_options.py --dry-run      # 移す件数を表示するだけ
+#   python migrate_options.py                # 書き換える前の票を migration_backup/ に CSV で残す
+#
+# 議題の選択肢を options の表に書き、今までの票に選択肢の番号（option_id）を付ける。
+# 何度実行しても移行済みの分はそのまま。保存先は [storage] backend の設定に従う。
+# 移行前後で票数が変わらないことは benchmarks/check_migrate_options.py で確かめられる。
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="議題の選択肢を options の表へ移し、票に選択肢の番号を付ける")
+    parser.add_argument("--dry-run", action="store_true", help="件数を表示するだけで書き換えない")
+    parser.add_argument("--backup-dir", default="migration_backup",
+                        help="書き換える前の票を CSV で残すディレクトリ（省略時 migration_backup）")
+    args = parser.parse_args(argv)
+
+    result = db_handler.migrate_options(dry_run=args.dry_run, backup_dir=args.backup_dir)
+    label = "移行対象" if args.dry_run else "移行しました"
+    print(f"{label}: 選択肢 {result['options']} 行 / 投票 {result['votes']} 件 / アーカイブの投票 {result['archived_votes']} 件")
+    for path in result["backups"]:
+        print(f"  書き換える前の票: {path}")
+
+
+if __name__ == "__main__":
+    main()
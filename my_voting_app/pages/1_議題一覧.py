@@ -1,6 +1,5 @@
 import streamlit as st
 import pandas as pd
-import time
 import datetime
 import sys
 import os
@@ -9,6 +8,10 @@ from background import set_background
 # パス設定
 sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/..'))
 import db_handler 
+from settings import get_setting
+from auto_refresh import auto_refresh
+import metrics
+metrics.begin_page("議題一覧")  # このページからの読み書きを計測する
 
 # ---------------------------------------------------------
 # ページ設定
@@ -22,10 +25,6 @@ if "logged_in_user" not in st.session_state or st.session_state.logged_in_user i
     st.page_link("Home.py", label="ログイン画面へ戻る", icon="🏠")
     st.stop()
 
-# 一時記憶の初期化
-if "just_voted_topics" not in st.session_state:
-    st.session_state.just_voted_topics = []
-
 # ---------------------------------------------------------
 # ヘッダー & フィルタ UI
 # ---------------------------------------------------------
@@ -53,60 +52,32 @@ with col4:
     st.write("")
     if st.button("⬇️ 降順"): st.session_state.fg = 1
 
+# ほかの人の投票・議題の追加を自動で反映する（オンにしたときだけ）
+auto_refresh("list")
+
 # ---------------------------------------------------------
 # データ取得（ここを修正！）
 # ---------------------------------------------------------
 
-# ▼▼▼ 修正1：キャッシュを削除（ttl設定を消すのではなく、デコレータ自体を消す） ▼▼▼
-# 学校の課題レベルのアクセス数なら、キャッシュなし(毎回読み込み)でもAPI制限には引っかかりにくいです。
-# 安全策としてキャッシュを使わず、確実に最新データを取ります。
-
-def load_topics():
-    df = db_handler.get_topics_from_sheet()
-    
-    # データの「型」をすべて「文字(str)」に統一します（これが重要！）
-    # 数字の「1」と文字の「1」が違うせいで判定ミスするのを防ぎます
-    df = df.astype(str)
-    
-    # 列がない場合のエラー回避
-    if "owner_email" not in df.columns:
-        df["owner_email"] = ""
-    
-    return df
-
-topics_df = load_topics()
+# ▼▼▼ キャッシュは db_handler 側で持っています ▼▼▼
+# st.cache_data だと投票直後に古い票数が出てしまうので使いません。
+# db_handler のキャッシュは書き込み時にすぐ更新されるため、自分の投票は即反映され、
+# 何も操作していない再実行ではAPIを呼びません（期限は [cache] ttl_seconds）。
+
+# 列の型（文字・日時・カテゴリ）や足りない列は db_handler 側でそろえてあります
+# （deadline は日時型、メールアドレスは小文字で届きます）
+topics_df = db_handler.get_topics_from_sheet()
 
 if topics_df.empty:
     st.info("まだ議題が登録されていません。")
     st.stop()
 
-def load_votes():
-    df = db_handler.get_votes_from_sheet()
-    
-    # こちらもすべてのデータを「文字(str)」に統一
-    df = df.astype(str)
-    
-    if "voted_email" not in df.columns:
-        df["voted_email"] = ""
-    if "topic_title" not in df.columns:
-        df["topic_title"] = ""
-    
-    return df
-
-votes_df = load_votes()
-
 # ---------------------------------------------------------
 # データ加工
 # ---------------------------------------------------------
 now = pd.Timestamp.now(tz="Asia/Tokyo").tz_localize(None)
 
-topics_df["deadline"] = pd.to_datetime(
-    topics_df["deadline"],
-    errors="coerce",
-    format="%Y-%m-%d %H:%M"
-)
-
-display_df = topics_df.copy()
+display_df = topics_df
 
 # 締め切りフィルタ
 display_df = display_df[
@@ -121,12 +92,6 @@ display_df = display_df[
     display_df["uuid"].notna() & (display_df["uuid"] != "")
 ]
 
-# 並び替え
-display_df = display_df.sort_values(
-    "deadline",
-    ascending=(st.session_state.fg == 0)
-)
-
 # 日付指定フィルタ
 if input_date:
     display_df = display_df[display_df["deadline"].dt.date == input_date]
@@ -135,49 +100,111 @@ if input_date:
         st.stop()
 
 # 自分の議題のみ
-current_user = str(st.session_state.logged_in_user)
+current_user = db_handler.normalize_email(st.session_state.logged_in_user)
 if my_only:
     display_df = display_df[display_df["owner_email"] == current_user]
     if display_df.empty:
         st.info("あなたが作成した議題はありません。")
         st.stop()
 
+# 並び替え（絞り込んだ後の分だけ）
+display_df = display_df.sort_values(
+    "deadline",
+    ascending=(st.session_state.fg == 0)
+)
+
 # ---------------------------------------------------------
-# 議題ループ表示
+# ページ分割
 # ---------------------------------------------------------
-for index, topic in display_df.iterrows():
+# 議題が多いと、全件分の枠・ラジオボタン・票数を一度に作るだけで重くなるので、
+# 表示するページの分だけ切り出してから部品を作ります。
+PAGE_SIZE_CHOICES = [5, 10, 20, 50]
+if "topic_page_size" not in st.session_state:
+    st.session_state.topic_page_size = get_setting("topic_list", "page_size", 10)
+if "topic_page" not in st.session_state:
+    st.session_state.topic_page = 0
+
+# 絞り込み・並び順が変わったら1ページ目に戻す
+filter_key = (input_date, my_only, st.session_state.fg)
+if st.session_state.get("topic_filter_key") != filter_key:
+    st.session_state.topic_filter_key = filter_key
+    st.session_state.topic_page = 0
+
+page_size = st.session_state.topic_page_size
+total = len(display_df)
+page_count = max(1, -(-total // page_size))
+st.session_state.topic_page = min(st.session_state.topic_page, page_count - 1)
+
+def go_to_page(page):
+    st.session_state.topic_page = page
+
+def pager(position):
+    page = st.session_state.topic_page
+    col_prev, col_info, col_next = st.columns([0.25, 0.5, 0.25])
+    with col_prev:
+        st.button("◀ 前へ", key=f"prev_{position}", disabled=(page == 0),
+                  on_click=go_to_page, args=(page - 1,), use_container_width=True)
+    with col_info:
+        first = page * page_size + 1
+        last = min((page + 1) * page_size, total)
+        st.markdown(f"<div style='text-align:center;'>{page + 1} / {page_count} ページ（全{total}件中 {first}〜{last}件）</div>",
+                    unsafe_allow_html=True)
+    with col_next:
+        st.button("次へ ▶", key=f"next_{position}", disabled=(page >= page_count - 1),
+                  on_click=go_to_page, args=(page + 1,), use_container_width=True)
+
+start = st.session_state.topic_page * page_size
+page_df = display_df.iloc[start:start + page_size]
+
+if page_count > 1:
+    pager("top")
+
+# ---------------------------------------------------------
+# 議題カード（1枚ずつ fragment）
+# ---------------------------------------------------------
+# 投票・締め切りの操作をしたら、そのカードだけを描き直します（ページ全体は再実行しません）。
+# 操作はボタンの on_click で先に済ませ、その後の描き直しで
+# 票数・投票済みかどうか・status を db_handler のキャッシュから引くので、その場で反映されます。
+def vote(index, uuid, title, options_raw):
+    key = f"text_{index}" if options_raw == "FREE_INPUT" else f"radio_{index}"
+    value = st.session_state.get(key)
+    if not value:
+        st.session_state[f"card_error_{uuid}"] = "回答を入力してください"
+    elif db_handler.add_vote_to_sheet(title, value, current_user, uuid):
+        # 書き込みはバックグラウンドで行われるので待たずにこのカードだけ描き直す
+        st.session_state[f"card_message_{uuid}"] = "投票しました！"
+
+def close_topic(uuid):
+    db_handler.close_topic_status(uuid)
+    st.session_state[f"card_message_{uuid}"] = "終了しました！"
+
+@st.fragment
+def topic_card(index, topic):
+    uuid = str(topic["uuid"])
     title = topic["title"]
     author = topic.get("author", "不明")
     options_raw = topic["options"]
     deadline = topic.get("deadline", pd.NaT)
-    status = topic.get("status", "active")
+    # 締め切った直後のカードでも最新の status を使う
+    status = db_handler.get_topic_status(uuid) or topic.get("status", "active")
     owner_email = topic.get("owner_email", "")
 
+    # 操作直後の描き直しでお知らせを出す
+    message = st.session_state.pop(f"card_message_{uuid}", None)
+    if message:
+        st.toast(message, icon="✅")
+
     if pd.notna(deadline):
         deadline_str = deadline.strftime("%Y-%m-%d %H:%M")
     else:
         deadline_str = "未設定"
 
     is_closed = (status == 'closed')
-    
-    # ▼▼▼ 重複投票チェック（シンプルかつ確実な比較） ▼▼▼
-    has_voted = False
-    
-    # 1. データ上のチェック
-    if not votes_df.empty:
-        # タイトルも「文字」同士で比較
-        this_topic_votes = votes_df[votes_df["uuid"] == str(topic["uuid"])]
-        
-        # 投票者リストを取得（すでにstr変換済みなのでそのままリスト化）
-        voter_list = this_topic_votes["voted_email"].tolist()
-        
-        # 完全に一致するかチェック
-        if current_user in voter_list:
-            has_voted = True
-    
-    # 2. 直前の操作履歴チェック
-    if str(topic["uuid"]) in st.session_state.just_voted_topics:
-        has_voted = True
+
+    # ▼▼▼ 重複投票チェック（自分が投票した議題の集合で判定） ▼▼▼
+    # 自分の直前の投票も、書き込み前から集計に入っています
+    tally = db_handler.get_vote_tally()
+    has_voted = tally.has_voted(uuid, current_user)
 
     with st.container(border=True):
         if is_closed:
@@ -191,10 +218,8 @@ for index, topic in display_df.iterrows():
         if owner_email and current_user == owner_email and not is_closed:
              with st.popover("⚠️ 投票を締め切る"):
                 st.write("本当に終了しますか？")
-                if st.button("はい、終了します", key=f"close_{index}", type="primary"):
-                    db_handler.close_topic_status(title)
-                    st.success("終了しました！")
-                    st.rerun()
+                st.button("はい、終了します", key=f"close_{index}", type="primary",
+                          on_click=close_topic, args=(uuid,))
 
         st.markdown("---")
 
@@ -214,114 +239,58 @@ for index, topic in display_df.iterrows():
                 
             # ▼ 未投票 ▼
             else:
-                submit_value = None
                 if options_raw == "FREE_INPUT":
                     st.markdown("**回答を入力してください**")
-                    submit_value = st.text_area("あなたの意見", key=f"text_{index}")
+                    st.text_area("あなたの意見", key=f"text_{index}")
                 else:
                     st.markdown("**選択肢を選んでください**")
                     try:
-                        options_list = str(options_raw).split("/")
-                        submit_value = st.radio("選択肢", options_list, key=f"radio_{index}", label_visibility="collapsed")
+                        options_list = db_handler.get_topic_options(uuid, options_raw)
+                        st.radio("選択肢", options_list, key=f"radio_{index}", label_visibility="collapsed")
                     except:
                         st.error("データエラー")
 
-                if st.button("👍 投票する", key=f"vote_{index}", type="primary"):
-                    if not submit_value:
-                        st.error("回答を入力してください")
-                    else:
-                        db_handler.add_vote_to_sheet(title, submit_value, current_user,topic["uuid"])
-                        st.session_state.just_voted_topics.append(topic["uuid"])
-                        st.success("投票しました！")
-                        time.sleep(3)
-                        st.rerun()
+                st.button("👍 投票する", key=f"vote_{index}", type="primary",
+                          on_click=vote, args=(index, uuid, title, options_raw))
+                error = st.session_state.pop(f"card_error_{uuid}", None)
+                if error:
+                    st.error(error)
 
         # 右カラム：投票数集計表示
         with col2:
             st.write("### 📊 現在の投票数")
-            # タイトルも文字型で比較して抽出
-            topic_votes = votes_df[votes_df["uuid"] == str(topic["uuid"])] if not votes_df.empty else pd.DataFrame()
+            counts = tally.counts_for(uuid)
             
             if options_raw == "FREE_INPUT":
-                if topic_votes.empty:
+                if not counts:
                     st.write("まだ投票はありません")
                 else:
-                    counts = topic_votes["option"].value_counts()
                     for opt, count in counts.items():
                         st.write(f"・{opt}：{count} 票")
             else:
                 try:
-                    options = str(options_raw).split("/")
+                    options = db_handler.get_topic_options(uuid, options_raw)
                 except:
                     options = []
 
-                if topic_votes.empty:
-                    for opt in options:
-                        st.write(f"{opt}：0 票")
-                else:
-                    counts = topic_votes["option"].value_counts()
-                    for opt in options:
-                        st.write(f"{opt}：{counts.get(opt, 0)} 票")
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+                for opt in options:
+                    st.write(f"{opt}：{counts.get(opt, 0)} 票")
 
 
+# このページの分だけカードを並べる
+for index, topic in page_df.iterrows():
+    topic_card(index, topic)
 
+# ---------------------------------------------------------
+# ページ送り・表示件数
+# ---------------------------------------------------------
+if page_count > 1:
+    pager("bottom")
+
+st.selectbox(
+    "1ページの表示件数",
+    sorted(set(PAGE_SIZE_CHOICES) | {page_size}),
+    key="topic_page_size",
+    on_change=go_to_page,
+    args=(0,),
+)
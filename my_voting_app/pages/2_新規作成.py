@@ -7,6 +7,9 @@ from background import set_background
 # パス設定
 sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/..'))
 import db_handler 
+import topic_import  # CSV / TSV からのまとめて作成
+import metrics
+metrics.begin_page("新規作成")  # このページからの読み書きを計測する
 
 # ---------------------------------------------------------
 # ページ設定
@@ -34,7 +37,7 @@ if "num_options" not in st.session_state:
 def reset_form():
     st.session_state.creation_completed = False
     st.session_state.num_options = 2
-    keys_to_clear = ["input_title", "input_author"] + [k for k in st.session_state.keys() if k.startswith("option_")]
+    keys_to_clear = ["input_title", "input_author", "created_count", "bulk_file"] + [k for k in st.session_state.keys() if k.startswith("option_")]
     for k in keys_to_clear:
         if k in st.session_state: del st.session_state[k]
 
@@ -53,7 +56,10 @@ def remove_option():
 # 【パターンA】作成完了画面
 if st.session_state.creation_completed:
     st.title("✅ 作成完了！")
-    st.success("新しい議題を作成しました。")
+    if st.session_state.get("created_count", 1) > 1:
+        st.success(f"{st.session_state.created_count} 件の新しい議題を作成しました。")
+    else:
+        st.success("新しい議題を作成しました。")
     
     st.markdown("---")
     
@@ -72,6 +78,38 @@ else:
     st.title("✨ 新しい議題を作成する")
     st.caption("チームのみんなに聞いてみたいことを投稿しましょう！")
 
+    # --- CSV / TSV からまとめて作成（会議の議題をいくつも作るとき） ---
+    with st.expander("📄 CSV / TSV からまとめて作成"):
+        st.caption(
+            "1行に1議題。見出し行に title, author, options（「/」区切り）, "
+            "deadline（例：2025-04-01 18:00）, type（choice / free）を書いてください。"
+        )
+        uploaded = st.file_uploader("ファイルを選択", type=["csv", "tsv", "txt"], key="bulk_file")
+        if uploaded is not None:
+            try:
+                bulk_df, errors_df = topic_import.validate(topic_import.read_table(uploaded.getvalue(), uploaded.name))
+            except ValueError as e:
+                st.error(f"⚠️ {e}")
+            else:
+                if not errors_df.empty:
+                    # 1件でも問題があれば作らない（直して全部まとめて作り直せるように）
+                    st.error(f"⚠️ {len(errors_df)} 件の問題があります。ファイルを直してもう一度選択してください。")
+                    st.dataframe(errors_df, hide_index=True)
+                elif bulk_df.empty:
+                    st.warning("⚠️ 議題が1件もありません。")
+                else:
+                    # 選択肢はリストなので、確認用の表では " / " でつないで見せる
+                    preview = bulk_df.assign(options=[
+                        " / ".join(o) if isinstance(o, list) else "（自由記述）" for o in bulk_df["options"]
+                    ])
+                    st.dataframe(preview, hide_index=True)
+                    if st.button(f"この {len(bulk_df)} 件の議題をまとめて作成する", type="primary", use_container_width=True):
+                        created = db_handler.add_topics_to_sheet(bulk_df, st.session_state.logged_in_user)
+                        if created:
+                            st.session_state.created_count = created
+                            st.session_state.creation_completed = True
+                            st.rerun()
+
     
     with st.container(border=True):
         st.subheader("📝 議題の内容")
@@ -131,7 +169,7 @@ else:
         # --- 作成ボタン ---
         if st.button("この内容で議題を作成する", type="primary", use_container_width=True):
             
-            final_options_str = ""
+            final_options = []
             is_valid = True
 
             # 1. タイトルチェック
@@ -157,9 +195,9 @@ else:
                     st.error("⚠️ 選択肢は少なくとも2つ以上入力してください。")
                     is_valid = False
                 else:
-                    final_options_str = "/".join(valid_opts)
+                    final_options = valid_opts
             else:
-                final_options_str = "FREE_INPUT"
+                final_options = "FREE_INPUT"
 
             # 保存処理
             if is_valid:
@@ -167,7 +205,7 @@ else:
                     formatted_deadline = deadline_dt.strftime("%Y-%m-%d %H:%M")
                     current_email = st.session_state.logged_in_user
                     
-                    db_handler.add_topic_to_sheet(title, author, final_options_str, formatted_deadline, current_email)
+                    db_handler.add_topic_to_sheet(title, author, final_options, formatted_deadline, current_email)
                     
                     st.session_state.creation_completed = True
                     st.rerun() 
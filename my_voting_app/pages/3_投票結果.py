@@ -1,22 +1,23 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import time
 import sys
 import os
+import datetime
+import tempfile
+import logging
 from background import set_background  #  # 背景画像の設定ファイルをインポート
-from google import genai # gemini api
-
-# 環境変数から API キーを取得
-API_KEY = os.getenv('GEMINI_API_KEY')
-
-# Gemini クライアント初期化
-client = genai.Client(api_key=API_KEY)
 
 
 # db_handler.py を読み込めるようにパスを通す
 sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/..'))
 import db_handler
+import ai_analysis  # Gemini の分析（クライアントは分析するときに作る）
+import export  # CSV / Parquet の書き出し
+import dashboard  # 自分の締切済み議題のまとめ
+from auto_refresh import auto_refresh
+import metrics
+metrics.begin_page("投票結果")  # このページからの読み書きを計測する
 
 
 
@@ -39,15 +40,21 @@ if "logged_in_user" not in st.session_state or st.session_state.logged_in_user i
 
 # データ取得
 topics_df = db_handler.get_topics_from_sheet()
-votes_df = db_handler.get_votes_from_sheet()
+tally = db_handler.get_vote_tally()  # uuid -> 選択肢ごとの票数
 
+# 締め切りから時間がたった議題はアーカイブに移されているので、選んだときだけ読む
+show_archive = st.checkbox("📦 アーカイブ済みの議題も表示する")
+# 票数の変化を自動で反映する（オンにしたときだけ）
+auto_refresh("results")
+archived_uuids = set()
+if show_archive:
+    archived_df = db_handler.get_archived_topics()
+    if not archived_df.empty:
+        archived_uuids = set(archived_df["uuid"].astype(str))
+        topics_df = db_handler.typed_topics(pd.concat([topics_df, archived_df], ignore_index=True))
 
-# 日付変換
-if not topics_df.empty and "deadline" in topics_df.columns:
-    topics_df["deadline_parsed"] = pd.to_datetime(
-        topics_df["deadline"], errors="coerce"
-    )
-    
+
+# deadline は db_handler 側で日時型にしてあります
 
 
 # 今日の日付
@@ -58,51 +65,86 @@ now = pd.Timestamp.now(tz="Asia/Tokyo").tz_localize(None)
 
 
 # ログインユーザー
-current_user = str(st.session_state.logged_in_user).strip()
+current_user = db_handler.normalize_email(st.session_state.logged_in_user)
 
 # 締切済み ＋ 自分が作成した議題のみ抽出
 if (
     not topics_df.empty
-    and {"deadline_parsed", "status", "owner_email"}.issubset(topics_df.columns)
+    and {"deadline", "status", "owner_email"}.issubset(topics_df.columns)
 ):
     finished_topics = topics_df[
         (
             (
-                topics_df["deadline_parsed"].notna()
-                & (topics_df["deadline_parsed"] < now)
+                topics_df["deadline"].notna()
+                & (topics_df["deadline"] < now)
             )
             | (topics_df["status"] == "closed")
         )
-        & (topics_df["owner_email"].astype(str).str.strip() == current_user)
+        & (topics_df["owner_email"] == current_user)
         & (topics_df["status"] != "deleted")  # ← 論理削除済みを除外
     ].copy()
 else:
     finished_topics = pd.DataFrame()
 
 
-# 議題ドロップダウン
+# =============================
+# ダッシュボード（自分の締切済み議題をまとめて集計）
+# =============================
+# 議題を1つずつ選ばなくても、全部の議題の結果を1つの表とグラフで見られるようにする
+if not finished_topics.empty:
+    with st.expander("📈 自分の締切済み議題のまとめ", expanded=True):
+        finished_uuids = finished_topics["uuid"].astype(str).tolist()
+        voters = tally.voters_for(finished_uuids)
+        archived_tally = None
+        if archived_uuids:
+            archived_tally = db_handler.get_archived_vote_tally()
+            voters |= archived_tally.voters_for(finished_uuids)
+        # 集計は選択肢の番号で持っているので、ここで選択肢の文字列に直す
+        all_counts = {
+            uuid: (archived_tally if uuid in archived_uuids else tally).counts_for(uuid)
+            for uuid in finished_uuids
+        }
+        summary_df, counts_df = dashboard.summarize(finished_topics, all_counts, len(voters))
+
+        st.caption("列名をクリックすると並べ替えられます。投票率は、ここにある議題のどれかに投票した人のうち、その議題に投票した人の割合です。")
+        st.dataframe(
+            summary_df.drop(columns="uuid"),
+            hide_index=True,
+            column_config={
+                "締め切り": st.column_config.DatetimeColumn(format="YYYY-MM-DD HH:mm"),
+                "投票率": st.column_config.NumberColumn(format="%.1f%%"),
+                "差（pt）": st.column_config.NumberColumn(format="%.1f"),
+            },
+        )
+        if not counts_df.empty:
+            st.plotly_chart(dashboard.small_multiples(counts_df))
+
+
+# 議題ドロップダウン（値は uuid。同じタイトルの議題があっても取り違えない）
 if finished_topics.empty:
-    topic_titles = ["（自分が作成した締切済みの議題がありません）"]
+    topic_labels = {None: "（自分が作成した締切済みの議題がありません）"}
 else:
-    topic_titles = finished_topics["title"].tolist()
+    # 同じタイトルの2件目以降は、ダッシュボードと同じく番号を付けて見分ける
+    topic_labels = dict(zip(finished_topics["uuid"].astype(str), dashboard.topic_labels(finished_topics)))
 
-selected_topic = st.selectbox("議題を選択してください", topic_titles)
-result_df = pd.DataFrame()
+topic_uuid = st.selectbox("議題を選択してください", list(topic_labels), format_func=topic_labels.get)
+selected_topic = None
 options = None
-topic_votes = pd.DataFrame()
 result_df = pd.DataFrame()
 # 表示処理
-if finished_topics.empty or selected_topic == "（締切済みの議題がありません）":
+if topic_uuid is None:
     st.info("締切済みの議題はまだありません。")
 
 else:
-    topic_row = finished_topics[finished_topics["title"] == selected_topic].iloc[0]
-    options = topic_row["options"].split("/")
+    topic_row = finished_topics[finished_topics["uuid"].astype(str) == topic_uuid].iloc[0]
+    selected_topic = topic_row["title"]
+    options = db_handler.get_topic_options(topic_row["uuid"], topic_row["options"])
 
-    topic_votes = (
-        votes_df[votes_df["topic_title"] == selected_topic]
-        if not votes_df.empty else pd.DataFrame()
-    )
+    # タイトルではなく uuid で集計を引く（同じタイトルの議題があっても混ざらない）
+    if str(topic_row["uuid"]) in archived_uuids:
+        counts = db_handler.get_archived_vote_tally().counts_for(topic_row["uuid"])
+    else:
+        counts = tally.counts_for(topic_row["uuid"])
 
     st.subheader(f"📝 議題：{selected_topic}")
 
@@ -113,8 +155,7 @@ else:
         st.stop()
     else:
         if options == ["FREE_INPUT"]:
-            # 自由入力の場合は votes_df の option 列を選択肢として集計
-            counts = topic_votes["option"].value_counts() if not topic_votes.empty else {}
+            # 自由入力の場合は投票された回答をそのまま選択肢として集計
             for opt, cnt in counts.items():
                 result.append({
                     "選択肢": opt,
@@ -122,7 +163,6 @@ else:
                 })
         else:
             # 通常の選択肢の場合
-            counts = topic_votes["option"].value_counts() if not topic_votes.empty else {}
             for opt in options:
                 result.append({
                     "選択肢": opt,
@@ -134,15 +174,10 @@ else:
         # 表表示
         st.dataframe(result_df, hide_index=True)
 
-# finished_topics から選択されたトピックの UUID を取得
-if not finished_topics.empty and selected_topic in finished_topics["title"].values:
-    topic_uuid = finished_topics[finished_topics["title"] == selected_topic]["uuid"].values[0]
-else:
-    topic_uuid = None
-
 if not result_df.empty:
     
-    # 円グラフ
+    # 円グラフ（plotly は読み込みに時間がかかるので、グラフを描くときに読み込む）
+    import plotly.express as px
     fig_pie = px.pie(
         result_df,
         names="選択肢",
@@ -153,7 +188,8 @@ if not result_df.empty:
 
 
 # 削除ボタン
-if st.button("🗑️ 議題を削除") and topic_uuid:
+# アーカイブ済みの議題は読み取り専用
+if st.button("🗑️ 議題を削除", disabled=str(topic_uuid) in archived_uuids) and topic_uuid:
     deleted = db_handler.delete_topic_by_uuid(topic_uuid, current_user)
     if deleted:
         st.success(f"「{selected_topic}」を削除しました。")
@@ -163,6 +199,45 @@ if st.button("🗑️ 議題を削除") and topic_uuid:
         st.error("削除できませんでした（権限がないか既に削除済み）")
 
 
+# =============================
+# 書き出し（CSV / Parquet）
+# =============================
+with st.expander("📤 自分の議題の投票を書き出す（CSV / Parquet）"):
+    export_kind = st.radio(
+        "内容", ["tally", "votes"], horizontal=True,
+        format_func={"tally": "議題・選択肢ごとの票数", "votes": "投票の明細"}.get,
+    )
+    export_format = st.radio("形式", list(export.FORMATS), horizontal=True)
+    export_range = st.date_input("投票日の範囲（空欄なら全期間）", value=[], key="export_range")
+    export_since = export_range[0] if len(export_range) >= 1 else None
+    export_until = export_range[1] + datetime.timedelta(days=1) if len(export_range) == 2 else None
+
+    def build_export():
+        # ボタンが押されたときだけ作る。保存先から少しずつ読んで一時ファイルに追記し、bytes で返す。
+        # スクリプトの実行の外で呼ばれるので st.error は画面に出ない。失敗したらログに残し、
+        # ダウンロードしたファイルの中身として理由を返す
+        try:
+            with tempfile.TemporaryFile() as f:
+                export.export(
+                    export_kind, export_format, f,
+                    owner_email=current_user, since=export_since, until=export_until,
+                    include_archive=show_archive,
+                )
+                f.seek(0)
+                return f.read()
+        except Exception as e:
+            logging.getLogger(__name__).exception("書き出しに失敗しました")
+            return f"書き出しに失敗しました: {e}\n".encode("utf-8")
+
+    st.download_button(
+        "⬇️ ダウンロード",
+        data=build_export,
+        file_name=f"{export_kind}.{export_format}",
+        mime=export.FORMATS[export_format],
+        on_click="ignore",
+    )
+
+
 
     
 # =============================
@@ -170,50 +245,35 @@ if st.button("🗑️ 議題を削除") and topic_uuid:
 # =============================
 st.divider()
 st.subheader("🔍 Geminiによる投票結果分析")
+# 分析はバックグラウンドで実行し、同じ集計の分析結果は使い回す
 if st.button("🧠AIに分析してもらう"):
-    with st.spinner("Gemini が分析中です..."):
-
-        analysis_prompt = f"""
-# 命令: あなたは厳格で経験豊富なデータアナリストです。
-以下の「制約事項」と「出力テンプレート」を**一言一句厳守**し、提供されたCSVデータを分析してください。
-
-# 制約事項 (重要)
-1. **生データの隠蔽**: 入力されたCSVデータ自体は、回答に**絶対に**含めないでください。
-2. **フォーマット厳守**: 以下の「出力テンプレート」の構造、見出し、箇条書きのスタイルを崩さないでください。
-3. **可読性向上**: 重要な数値（得票数やパーセンテージ）やキーワードは **太字** で強調してください。
-4. **客観性**: 主観的な感想は排除し、データに基づいた事実と論理的な推測のみを記述してください。
-5. **テンプレート外禁止**: テンプレートに書かれていない文言は**絶対に出力しない**でください。
-6. **終了条件**: 出力はテンプレートの最終行までで終了すること。
-
-# 出力テンプレート
----
-## 📊 分析概要
-（ここに、データ全体から読み取れる最も重要な結論を2〜3行で簡潔に記述。）
-
-## 📈 投票傾向
-- **（傾向の要約1）**: （具体的な数値を用いる）
-- **（傾向の要約2）**
-- **（傾向の要約3）**
-
-## 🧠 支持理由の推測
-- **（推測される理由1）**
-- **（推測される理由2）**
-
-## 🔍 全体の特徴・特異点
-- （分布の特徴）
-- （特筆すべき点）
-
-# 解析対象データ
-議題:{selected_topic}
-CSVデータ:{result_df.to_csv(index=False)}
-"""
-
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=analysis_prompt
-        )
+    if topic_uuid is None:
+        st.warning("分析できる議題がありません。")
+    else:
+        ai_analysis.start_analysis(topic_uuid, selected_topic, result_df)
+
+analysis_key = ai_analysis.find_cached_analysis(topic_uuid, result_df) if topic_uuid else None
+
+def show_analysis():
+    status, value = ai_analysis.get_analysis(analysis_key)
+    if status == "pending":
+        st.info("⏳ Gemini が分析中です...（終わると自動で表示されます）")
+    elif status == "done":
+        st.write(value)
+    elif status == "error":
+        st.error(f"分析に失敗しました: {value}")
+
+def poll_analysis():
+    # 分析が終わったらページ全体を再実行して、自動更新を止める
+    if ai_analysis.get_analysis(analysis_key)[0] != "pending":
+        st.rerun()
+    show_analysis()
 
-        st.write(response.text)
+if analysis_key is not None:
+    if ai_analysis.get_analysis(analysis_key)[0] == "pending":
+        st.fragment(run_every=2)(poll_analysis)()
+    else:
+        show_analysis()
 
 
 
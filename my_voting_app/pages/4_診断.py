@@ -0,0 +1,72 @@
+import streamlit as st
+import pandas as pd
+import sys
+import os
+from background import set_background
+
+# パス設定
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + '/..'))
+import metrics
+from settings import get_setting
+from storage import normalize_email
+
+# ---------------------------------------------------------
+# ページ設定
+# ---------------------------------------------------------
+st.set_page_config(page_title="診断", page_icon="🩺", layout="wide")
+set_background("background.png")
+
+# ▼▼▼ 門番コード（ログイン + 管理者チェック） ▼▼▼
+if "logged_in_user" not in st.session_state or st.session_state.logged_in_user is None:
+    st.warning("⚠️ このページを見るにはログインが必要です。")
+    st.page_link("Home.py", label="ログイン画面へ戻る", icon="🏠")
+    st.stop()
+
+# 管理者は secrets.toml の [admin] emails = ["..."] で指定します
+# （ログインと同じく、大文字・小文字や前後の空白の違いは無視する）
+admin_emails = {normalize_email(e) for e in get_setting("admin", "emails", [])}
+if normalize_email(st.session_state.logged_in_user) not in admin_emails:
+    st.error("⛔ このページは管理者のみ閲覧できます。")
+    st.stop()
+
+# ---------------------------------------------------------
+# 表示
+# ---------------------------------------------------------
+st.title("🩺 診断")
+st.caption("このプロセスが起動してからの、ページごとの読み書きの回数・時間・行数です。")
+
+stats_df = pd.DataFrame(metrics.snapshot())
+reruns_df = pd.DataFrame(metrics.recent_reruns())
+
+if stats_df.empty:
+    st.info("まだ記録がありません。")
+    st.stop()
+
+api_df = stats_df[stats_df["operation"].str.startswith("sheets.")]
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("API呼び出し", int(api_df["calls"].sum()))
+col2.metric("受け渡した行数", int(api_df["rows"].sum()))
+col3.metric("エラー", int(api_df["errors"].sum()))
+col4.metric("429（制限超過）", int(api_df["rate_limited"].sum()))
+
+st.subheader("📊 操作ごと（ページ別）")
+page_filter = st.multiselect("ページで絞り込み", sorted(stats_df["page"].unique()))
+shown = stats_df[stats_df["page"].isin(page_filter)] if page_filter else stats_df
+st.dataframe(shown, hide_index=True, use_container_width=True)
+
+st.subheader("🔁 最近の再実行")
+st.caption("1回の再実行（ボタン操作・ページ表示）ごとの合計です。api_calls / rows / seconds はスプレッドシートAPIの分です。")
+st.dataframe(reruns_df, hide_index=True, use_container_width=True)
+
+st.subheader("📤 Prometheus 形式")
+prometheus_text = metrics.prometheus_text()
+st.download_button("metrics.txt をダウンロード", prometheus_text, file_name="metrics.txt", mime="text/plain")
+port = get_setting("metrics", "port", 0)
+if port:
+    st.caption(f"Prometheus からは http://<このサーバー>:{port}/metrics を取得できます。")
+with st.expander("内容を表示"):
+    st.code(prometheus_text, language="text")
+
+if st.button("記録をリセット"):
+    metrics.reset()
+    st.rerun()
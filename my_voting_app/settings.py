@@ -0,0 +1,42 @@
+import os
+import streamlit as st
+
+# ---------------------------------------------------------
+# アプリ設定の読み込み
+# ---------------------------------------------------------
+# 優先順位：
+#   1. 環境変数 VOTING_APP_<SECTION>_<KEY>（例：VOTING_APP_CACHE_TTL_SECONDS）
+#   2. secrets.toml の [section] key
+#   3. 既定値
+# 値は既定値と同じ型に変換して返す。
+
+_TRUE_WORDS = {"1", "true", "yes", "on"}
+
+
+def _cast(value, default):
+    if default is None or value is None:
+        return value
+    if isinstance(default, bool):
+        if isinstance(value, str):
+            return value.strip().lower() in _TRUE_WORDS
+        return bool(value)
+    if isinstance(default, (list, tuple)) and isinstance(value, str):
+        return [v.strip() for v in value.split(",") if v.strip()]
+    try:
+        return type(default)(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def get_setting(section, key, default=None):
+    env_name = f"VOTING_APP_{section}_{key}".upper()
+    if env_name in os.environ:
+        return _cast(os.environ[env_name], default)
+
+    try:
+        if section in st.secrets and key in st.secrets[section]:
+            return _cast(st.secrets[section][key], default)
+    except Exception:
+        # secrets.toml が無い環境（ローカル・ベンチマーク）では既定値を使う
+        pass
+    return default
@@ -0,0 +1,259 @@
+import base64
+import hashlib
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import urllib.parse
+from settings import get_setting
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ---------------------------------------------------------
+# 複数のレプリカで共有するキャッシュ
+# ---------------------------------------------------------
+# ロードバランサの後ろで Streamlit を何台も動かすと、db_handler のキャッシュは
+# プロセスごとなので、保存先の読み込みも台数分に増える。
+# ここに議題一覧と集計を置き、どのレプリカも同じものを使う。
+# secrets.toml の [shared_cache] backend で選ぶ（空なら使わない）。
+#   "redis" : Redis（または同じプロトコルを話すサーバー）。url = "redis://[:password@]host:port/db"
+#   "file"  : 同じマシン（または共有ボリューム）のディレクトリ。path = ディレクトリ
+# 値は bytes で預け、中身の形は db_handler が決める（JSON。読み出した値を pickle などで
+# 実行することはないが、アプリ専用のサーバー・ディレクトリを使うこと）。
+
+
+class SharedCacheError(Exception):
+    pass
+
+
+class SharedCache:
+    # 値（bytes）を返す。無い・期限切れなら None
+    def get(self, key):
+        raise NotImplementedError
+
+    # ttl 秒後に消える値を置く
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    # キーの数値を1増やして新しい値を返す（無ければ 0 から数える）
+    def incr(self, key):
+        raise NotImplementedError
+
+    # キーのリストの末尾に value を足し、期限を ttl 秒後に延ばす
+    def append(self, key, value, ttl):
+        raise NotImplementedError
+
+    # キーのリストの中身（無ければ空のリスト）
+    def items(self, key):
+        raise NotImplementedError
+
+
+# ---------------------------------------------------------
+# Redis（RESP プロトコルを直接話す。redis パッケージは不要）
+# ---------------------------------------------------------
+class RedisCache(SharedCache):
+    def __init__(self, url, timeout=2.0):
+        parsed = urllib.parse.urlparse(url)
+        if parsed.scheme != "redis":
+            raise ValueError(f"redis:// の URL を指定してください: {url}")
+        self.address = (parsed.hostname or "localhost", parsed.port or 6379)
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        # 応答を取り違えないよう、接続はスレッドごとに持つ
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=self.timeout)
+        conn = (sock, sock.makefile("rb"))
+        if self.password:
+            self._send(conn, "AUTH", self.password)
+        if self.db:
+            self._send(conn, "SELECT", self.db)
+        return conn
+
+    def _close(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+
+    @staticmethod
+    def _encode(arg):
+        if isinstance(arg, bytes):
+            return arg
+        return str(arg).encode("utf-8")
+
+    def _send(self, conn, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in map(self._encode, args):
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        conn[0].sendall(b"".join(parts))
+        return self._reply(conn[1])
+
+    def _reply(self, reader):
+        line = reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Redis との接続が切れました")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise SharedCacheError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            return None if size < 0 else reader.read(size + 2)[:-2]
+        if kind == b"*":
+            size = int(rest)
+            return None if size < 0 else [self._reply(reader) for _ in range(size)]
+        raise SharedCacheError(f"Redis の応答を読めません: {line!r}")
+
+    def command(self, *args):
+        # 接続が切れていたら1回だけつなぎ直す
+        for attempt in range(2):
+            try:
+                if getattr(self._local, "conn", None) is None:
+                    self._local.conn = self._connect()
+                return self._send(self._local.conn, *args)
+            except (OSError, ConnectionError):
+                self._close()
+                if attempt:
+                    raise
+
+    def get(self, key):
+        return self.command("GET", key)
+
+    def set(self, key, value, ttl):
+        self.command("SET", key, value, "PX", int(ttl * 1000))
+
+    def incr(self, key):
+        return self.command("INCR", key)
+
+    def append(self, key, value, ttl):
+        self.command("RPUSH", key, value)
+        self.command("PEXPIRE", key, int(ttl * 1000))
+
+    def items(self, key):
+        return self.command("LRANGE", key, 0, -1) or []
+
+
+# ---------------------------------------------------------
+# ファイル（1キー1ファイル。書き込みは一時ファイルから置き換えるので読み手は壊れた中身を見ない）
+# ---------------------------------------------------------
+class FileCache(SharedCache):
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+    # ファイルの中身は {"expires_at": 期限, "value": 値} の JSON。
+    # 値は整数（incr）か bytes（base64）か bytes のリスト（append）
+    def _read(self, key):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                item = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if item["expires_at"] is not None and item["expires_at"] < time.time():
+            return None
+        return _decode(item["value"])
+
+    def _write(self, key, value, ttl):
+        expires_at = None if ttl is None else time.time() + ttl
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": expires_at, "value": _encode(value)}, f)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _locked(self, key, func):
+        # 読んで書き直す操作（incr / append）は、別プロセスとも1つずつ行う
+        with self._lock, open(self._path(key) + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            return func()
+
+    def get(self, key):
+        return self._read(key)
+
+    def set(self, key, value, ttl):
+        self._write(key, value, ttl)
+
+    def incr(self, key):
+        def _incr():
+            value = int(self._read(key) or 0) + 1
+            self._write(key, value, None)
+            return value
+        return self._locked(key, _incr)
+
+    def append(self, key, value, ttl):
+        def _append():
+            self._write(key, (self._read(key) or []) + [value], ttl)
+        self._locked(key, _append)
+
+    def items(self, key):
+        return self._read(key) or []
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return {"b64": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        return base64.b64decode(value["b64"])
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+_UNSET = object()
+
+
+def create_shared_cache(name=None):
+    # 戻り値：共有キャッシュ（[shared_cache] backend が空なら None）
+    name = (name if name is not None else get_setting("shared_cache", "backend", "")).lower()
+    if not name:
+        return None
+    if name == "redis":
+        return RedisCache(get_setting("shared_cache", "url", "redis://localhost:6379/0"),
+                          timeout=get_setting("shared_cache", "timeout_seconds", 2.0))
+    if name == "file":
+        return FileCache(get_setting("shared_cache", "path", ".shared_cache"))
+    raise ValueError(f"不明な共有キャッシュです: {name}")
+
+
+def get_shared_cache():
+    # プロセス内で1つだけ作って使い回す（使わない設定なら None）
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = create_shared_cache() or _UNSET
+        return None if _shared_cache is _UNSET else _shared_cache
+
+
+def set_shared_cache(cache):
+    # テスト・ベンチマーク用に差し替える（None なら共有しない）
+    global _shared_cache
+    with _shared_cache_lock:
+        _shared_cache = cache if cache is not None else _UNSET
@@ -0,0 +1,687 @@
+import gspread
+from gspread.utils import rowcol_to_a1
+import requests
+import urllib3
+import pandas as pd
+import streamlit as st
+import os
+import re
+import random
+import threading
+import time
+import logging
+import metrics
+from settings import get_setting
+from storage import StorageBackend, normalize_email, TOPIC_COLUMNS, VOTE_COLUMNS, OPTION_COLUMNS
+
+# ---------------------------------------------------------
+# 設定
+# ---------------------------------------------------------
+SPREADSHEET_NAME = "voting_app_db"
+KEY_FILE = "key.json"
+SCOPES = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+
+# アクセストークン(有効期限1時間)が切れる前に接続を作り直す間隔（秒）
+CONNECTION_MAX_AGE = 45 * 60
+
+# API の呼び出しペース（Sheets API の「1分あたりのリクエスト数」の制限に合わせる）
+REQUESTS_PER_MINUTE = get_setting("sheets", "requests_per_minute", 60.0)
+REQUEST_BURST = get_setting("sheets", "burst", 10.0)
+# 429 / 5xx のときの再試行回数と待ち時間（秒）の上限
+MAX_RETRIES = get_setting("sheets", "max_retries", 5)
+RETRY_MAX_DELAY = get_setting("sheets", "retry_max_delay_seconds", 32.0)
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------
+# 接続の使い回し（プロセス内で1つだけ持つ）
+# ---------------------------------------------------------
+# Streamlit は再実行ごとにページのスクリプトを読み直すが、
+# import したモジュールはプロセス内で共有されるので、ここに接続を置いておく。
+_connection_lock = threading.RLock()
+_connection = {
+    "sheet": None,        # gspread の Spreadsheet
+    "worksheets": {},     # シート名 -> Worksheet
+    "created_at": 0.0,    # 接続を作った時刻（time.monotonic）
+}
+
+
+def _load_credentials():
+    # oauth2client は接続するときだけ使うので、ここで読み込む
+    from oauth2client.service_account import ServiceAccountCredentials
+    if os.path.exists(KEY_FILE):
+        try:
+            return ServiceAccountCredentials.from_json_keyfile_name(KEY_FILE, SCOPES)
+        except Exception as e:
+            st.error(f"認証ファイル(key.json)の読み込みエラー: {e}")
+            return None
+
+    try:
+        if "gcp_service_account" in st.secrets:
+            key_dict = dict(st.secrets["gcp_service_account"])
+            return ServiceAccountCredentials.from_json_keyfile_dict(key_dict, SCOPES)
+        return None
+    except Exception as e:
+        st.error(f"Secrets認証情報の読み込みエラー: {e}")
+        return None
+
+
+def reset_connection():
+    # 次の connect_to_sheet() で認証からやり直させる
+    with _connection_lock:
+        _connection["sheet"] = None
+        _connection["worksheets"] = {}
+        _connection["created_at"] = 0.0
+
+
+# ---------------------------------------------------------
+# Googleスプレッドシートに接続する関数
+# ---------------------------------------------------------
+def connect_to_sheet(force_refresh=False):
+    with _connection_lock:
+        age = time.monotonic() - _connection["created_at"]
+        if (
+            not force_refresh
+            and _connection["sheet"] is not None
+            and age < CONNECTION_MAX_AGE
+        ):
+            return _connection["sheet"]
+
+        creds = _load_credentials()
+        if creds is None:
+            return None
+
+        try:
+            with metrics.track("sheets.open", api=True):
+                client = gspread.authorize(creds)
+                sheet = client.open(SPREADSHEET_NAME)
+        except Exception as e:
+            reset_connection()
+            st.error(f"接続エラー: {e}")
+            return None
+
+        _connection["sheet"] = sheet
+        _connection["worksheets"] = {}
+        _connection["created_at"] = time.monotonic()
+        return sheet
+
+
+def get_worksheet(name, force_refresh=False):
+    # sheet.worksheet() も毎回APIを叩くので、ハンドルごと使い回す
+    with _connection_lock:
+        sheet = connect_to_sheet(force_refresh=force_refresh)
+        if sheet is None:
+            return None
+        worksheet = _connection["worksheets"].get(name)
+        if worksheet is None:
+            with metrics.track("sheets.worksheet", api=True):
+                worksheet = _ScheduledWorksheet(sheet.worksheet(name))
+            _connection["worksheets"][name] = worksheet
+        return worksheet
+
+
+def find_worksheet(name):
+    # まだ作られていないシート（アーカイブなど）は None
+    try:
+        return get_worksheet(name)
+    except gspread.exceptions.WorksheetNotFound:
+        return None
+
+
+# シートを作る処理だけを順番にする（同じシートを2回作らない）。API の順番待ち・再試行の
+# 間は _connection_lock を持たないので、他のシートの読み書きは止まらない
+_create_lock = threading.Lock()
+
+
+def create_worksheet(name, header):
+    # シートが無ければヘッダー行だけのシートを作る
+    with _create_lock:
+        worksheet = find_worksheet(name)
+        if worksheet is not None:
+            return worksheet
+        sheet = connect_to_sheet()
+        if sheet is None:
+            return None
+        _call_with_retry(
+            "sheets.add_worksheet",
+            lambda: sheet.add_worksheet(title=name, rows=1, cols=len(header)),
+            is_write=True,
+            count_rows=lambda result: 0,
+        )
+        worksheet = get_worksheet(name)
+        worksheet.append_row(list(header))
+        return worksheet
+
+
+# ---------------------------------------------------------
+# API呼び出しのペース配分と再試行
+# ---------------------------------------------------------
+class _TokenBucket:
+    # 1分あたり rate 回まで（burst 回までは続けて呼べる）。足りなければ待つ
+    def __init__(self, per_minute, burst):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_bucket = _TokenBucket(REQUESTS_PER_MINUTE, REQUEST_BURST)
+
+
+def _retryable(e, is_write):
+    # 429 は書き込みでも反映されていないので再試行できる。
+    # 5xx は書き込みが反映されたか分からないので、読み込みだけ再試行する。
+    if not isinstance(e, gspread.exceptions.APIError):
+        return False
+    status = getattr(e.response, "status_code", None)
+    if status == 429:
+        return True
+    return not is_write and status is not None and 500 <= status < 600
+
+
+def _request_not_sent(e):
+    # 接続の段階で失敗し、リクエストを送っていない（送った後の通信断・応答待ちのタイムアウトは含めない）
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(e, requests.exceptions.ConnectionError) and e.args:
+        reason = getattr(e.args[0], "reason", e.args[0])
+        return isinstance(reason, urllib3.exceptions.NewConnectionError)
+    return False
+
+
+def _call_with_retry(operation, func, is_write, count_rows):
+    delay = 1.0
+    for attempt in range(MAX_RETRIES + 1):
+        _bucket.acquire()
+        try:
+            with metrics.track(operation, api=True) as tracker:
+                result = func()
+                tracker.rows = count_rows(result)
+                return result
+        except Exception as e:
+            if attempt >= MAX_RETRIES or not _retryable(e, is_write):
+                raise
+            # 同時に再試行が集中しないよう、待ち時間に揺らぎを入れる
+            wait = random.uniform(0, delay)
+            logger.warning("%s が失敗しました（%.1f 秒後に再試行）: %s", operation, wait, e)
+            time.sleep(wait)
+            delay = min(delay * 2, RETRY_MAX_DELAY)
+
+
+class _ScheduledWorksheet:
+    # Worksheet のメソッド呼び出し（= API呼び出し）をペース配分・再試行し、
+    # 1回ずつ metrics に記録する
+    _WRITE_ROWS = {
+        "append_row": lambda args: 1,
+        "append_rows": lambda args: len(args[0]) if args else 0,
+        "update_cell": lambda args: 1,
+    }
+
+    def __init__(self, worksheet):
+        self._worksheet = worksheet
+
+    def __getattr__(self, name):
+        attr = getattr(self._worksheet, name)
+        if not callable(attr):
+            return attr
+
+        count_written = self._WRITE_ROWS.get(name)
+
+        def call(*args, **kwargs):
+            return _call_with_retry(
+                f"sheets.{name}",
+                lambda: attr(*args, **kwargs),
+                is_write=count_written is not None,
+                count_rows=(lambda result: count_written(args)) if count_written else metrics.count_rows,
+            )
+        return call
+
+
+def _is_connection_error(e):
+    # 認証切れ（401）か、接続できずにリクエストを送っていないときだけ繋ぎ直す。
+    # 送った後の通信断・タイムアウトは書き込みが反映されたか分からないので、呼び出し元で扱う
+    if isinstance(e, gspread.exceptions.APIError):
+        return getattr(e.response, "status_code", None) == 401
+    return _request_not_sent(e)
+
+
+def with_worksheet(name, action):
+    # 接続が切れていたら1回だけ繋ぎ直して再実行する（action は書き込みのこともあるので、
+    # 確実に反映されていない失敗のときだけ）
+    worksheet = get_worksheet(name)
+    if worksheet is None:
+        return None
+    try:
+        return action(worksheet)
+    except Exception as e:
+        if not _is_connection_error(e):
+            raise
+        reset_connection()
+        worksheet = get_worksheet(name, force_refresh=True)
+        if worksheet is None:
+            raise
+        return action(worksheet)
+
+
+# ---------------------------------------------------------
+# Googleスプレッドシート版の保存先
+# ---------------------------------------------------------
+class SheetsBackend(StorageBackend):
+    # 書き込み制限(429)があるので投票はまとめて書き込む
+    batch_writes = True
+
+    DEFAULT_HEADERS = {
+        "topics": TOPIC_COLUMNS,
+        "votes": VOTE_COLUMNS,
+        "topics_archive": TOPIC_COLUMNS,
+        "votes_archive": VOTE_COLUMNS,
+        "options": OPTION_COLUMNS,
+    }
+
+    def __init__(self):
+        self._headers = {}  # シート名 -> ヘッダー行
+        # 議題の uuid -> (シートの行番号, 作成者メアド)
+        # 終了・削除のたびに全件読み込みや find() をしないための索引。
+        # 全件読み込みのたびに作り直し、追加時は書き込んだ行を足す。
+        self._row_index = None
+        self._index_lock = threading.Lock()
+        # votes シートは追記しかされないので、同期済みの行までを覚えて差分だけ読む
+        self._votes_lock = threading.Lock()
+        self._votes_header = None     # 同期時のヘッダー行
+        self._votes_last_row = None   # 同期済みの最終行（差分を読むときの照合用）
+        self._votes_frame = None      # 同期済みの行の DataFrame
+        self.votes_generation = 0     # 全件読み直しのたびに増える（差分で足せないことの合図）
+
+    def _header(self, worksheet):
+        # 列の並びはシートのヘッダー行に合わせる（列番号を決め打ちしない）
+        header = self._headers.get(worksheet.title)
+        if header is None:
+            header = [h for h in worksheet.row_values(1) if h] or self.DEFAULT_HEADERS[worksheet.title]
+            self._headers[worksheet.title] = header
+        return header
+
+    def _to_row(self, worksheet, record):
+        return [record.get(col, "") for col in self._header(worksheet)]
+
+    def _vote_row(self, worksheet, record):
+        # option_id 列があるシートでは、選択肢の番号がある票の文字列を書かない。
+        # 移行前のシート（列が無い）には今まで通り文字列を書く
+        if "option_id" in self._header(worksheet) and record.get("option_id", "") != "":
+            record = {**record, "option": ""}
+        return self._to_row(worksheet, record)
+
+    def _read(self, name):
+        data = with_worksheet(name, lambda ws: ws.get_all_records())
+        if data is None:
+            return None
+        return pd.DataFrame(data)
+
+    def read_topics(self):
+        df = self._read("topics")
+        if df is not None:
+            self._rebuild_row_index(df)
+        return df
+
+    # ---------------------------------------------------------
+    # votes シートの差分同期
+    # ---------------------------------------------------------
+    # 2回目以降は「ヘッダー行」と「前回の最終行から下」を1回の batch_get で読み、
+    # 新しい行だけを DataFrame に足す。ヘッダーが変わった・前回の最終行が
+    # 一致しない（行が減った・並べ替えられた）ときだけ全件読み直す。
+    # 値は get_all_records のような数値変換をせず、シートの文字列のまま扱う。
+    def read_votes(self):
+        with self._votes_lock:
+            return with_worksheet("votes", self._sync_votes)
+
+    def _sync_votes(self, worksheet):
+        if self._votes_frame is None:
+            return self._full_sync_votes(worksheet)
+
+        header = self._votes_header
+        last_row = 1 + len(self._votes_frame)  # 同期済みの最終行の行番号
+        last_col = rowcol_to_a1(1, len(header)).rstrip("0123456789")
+        start = last_row if last_row > 1 else 2
+        header_values, tail = worksheet.batch_get(["1:1", f"A{start}:{last_col}"])
+
+        current_header = [h for h in (header_values[0] if header_values else []) if h]
+        if current_header != header:
+            return self._full_sync_votes(worksheet)
+
+        tail = [_pad(row, len(header)) for row in tail]
+        if last_row > 1:
+            # 重ねて読んだ前回の最終行が同じでなければ、シートが書き換えられている
+            if not tail or tail[0] != self._votes_last_row:
+                return self._full_sync_votes(worksheet)
+            tail = tail[1:]
+
+        if tail:
+            new_df = pd.DataFrame(tail, columns=header)
+            self._votes_frame = pd.concat([self._votes_frame, new_df], ignore_index=True)
+            self._votes_last_row = tail[-1]
+        return self._votes_frame
+
+    def _full_sync_votes(self, worksheet):
+        values = worksheet.get_all_values()
+        header = [h for h in (values[0] if values else []) if h] or list(VOTE_COLUMNS)
+        rows = [_pad(row, len(header)) for row in values[1:]]
+        # 末尾の空行は数えない（batch_get の結果と揃える）
+        while rows and not any(rows[-1]):
+            rows.pop()
+
+        self._votes_header = header
+        self._votes_frame = pd.DataFrame(rows, columns=header)
+        self._votes_last_row = rows[-1] if rows else None
+        self.votes_generation += 1
+        return self._votes_frame
+
+    def warm_up(self):
+        connect_to_sheet()
+
+    def is_transient_error(self, e):
+        # 429 と、接続できずに送っていない失敗だけ。5xx・読み込みのタイムアウトは行が書けたか
+        # 分からない（送り直すと票が二重になる）ので再送しない。権限（403）や範囲の誤り（400）は
+        # 何度送っても通らない
+        if isinstance(e, gspread.exceptions.APIError):
+            return getattr(e.response, "status_code", None) == 429
+        return _request_not_sent(e) or super().is_transient_error(e)
+
+    def data_version(self):
+        # スプレッドシート全体の最終更新日時（Drive のメタデータ1回分）。
+        # 他のプロセスや手作業での変更も含めて、どのシートが変わっても変わる
+        sheet = connect_to_sheet()
+        if sheet is None:
+            return None
+        return _call_with_retry(
+            "sheets.get_lastUpdateTime",
+            sheet.get_lastUpdateTime,
+            is_write=False,
+            count_rows=lambda result: 0,
+        )
+
+    def iter_votes(self, chunk_rows, archived=False):
+        # 2行目から chunk_rows 行ずつ範囲を指定して読む（空の範囲が返ったら終わり）
+        worksheet = find_worksheet("votes_archive" if archived else "votes")
+        if worksheet is None:
+            return
+        header = self._header(worksheet)
+        last_col = rowcol_to_a1(1, len(header)).rstrip("0123456789")
+        start = 2
+        while True:
+            rows = worksheet.get(f"A{start}:{last_col}{start + chunk_rows - 1}")
+            if not rows:
+                return
+            rows = [_pad(row, len(header)) for row in rows if any(row)]
+            if rows:
+                yield pd.DataFrame(rows, columns=header)
+            start += chunk_rows
+
+    def append_topics(self, records):
+        # 何件でも append_rows 1回で書き込む
+        result = with_worksheet(
+            "topics", lambda ws: ws.append_rows([self._to_row(ws, r) for r in records])
+        )
+        if result is None:
+            return False
+        row_number = _appended_row_number(result)
+        with self._index_lock:
+            if self._row_index is not None:
+                if row_number is None:
+                    # 書き込んだ行が分からなければ次に使うときに作り直す
+                    self._row_index = None
+                else:
+                    for i, record in enumerate(records):
+                        self._row_index[str(record["uuid"])] = (row_number + i, str(record.get("owner_email", "")))
+        return True
+
+    def append_votes(self, records):
+        result = with_worksheet(
+            "votes", lambda ws: ws.append_rows([self._vote_row(ws, r) for r in records])
+        )
+        return result is not None
+
+    # ---------------------------------------------------------
+    # 選択肢（options シート）
+    # ---------------------------------------------------------
+    # 議題を作るときに1回書くだけなので、シートは最初に書くときに作る。
+    def read_options(self):
+        return self._read_if_exists("options")
+
+    def append_options(self, records):
+        worksheet = create_worksheet("options", OPTION_COLUMNS)
+        if worksheet is None:
+            return False
+        worksheet.append_rows([self._to_row(worksheet, r) for r in records])
+        return True
+
+    def replace_vote_options(self, options, option_ids, archived=False):
+        name = "votes_archive" if archived else "votes"
+        with self._votes_lock:
+            worksheet = find_worksheet(name)
+            if worksheet is None:
+                return False
+            self._headers.pop(name, None)
+            header = self._header(worksheet)
+            if "option_id" not in header:
+                # 移行前のシートには右端に option_id 列を足す
+                if getattr(worksheet, "col_count", len(header) + 1) <= len(header):
+                    worksheet.add_cols(1)
+                worksheet.update_cell(1, len(header) + 1, "option_id")
+                header = header + ["option_id"]
+            # 2列分を1回の書き込みで
+            worksheet.batch_update([
+                {"range": _column_range(header, "option") + str(len(options) + 1),
+                 "values": [[v] for v in options]},
+                {"range": _column_range(header, "option_id") + str(len(option_ids) + 1),
+                 "values": [[v] for v in option_ids]},
+            ])
+            self._headers[name] = header
+            if not archived:
+                self._votes_frame = None
+        return True
+
+    # ---------------------------------------------------------
+    # uuid -> 行番号の索引
+    # ---------------------------------------------------------
+    def _rebuild_row_index(self, df):
+        index = {}
+        if "uuid" in df.columns:
+            owners = df["owner_email"] if "owner_email" in df.columns else [""] * len(df)
+            for i, (uuid, owner) in enumerate(zip(df["uuid"], owners)):
+                if str(uuid) != "":
+                    index.setdefault(str(uuid), (i + 2, str(owner)))  # ヘッダー分
+        with self._index_lock:
+            self._row_index = index
+
+    def _load_row_index(self, worksheet):
+        # 全件ではなく uuid 列と owner_email 列だけを1回で読む
+        header = self._header(worksheet)
+        if "uuid" not in header:
+            return {}
+        names = [name for name in ("uuid", "owner_email") if name in header]
+        columns = worksheet.batch_get([_column_range(header, name) for name in names])
+        values = {
+            name: [row[0] if row else "" for row in column]
+            for name, column in zip(names, columns)
+        }
+        uuids = values["uuid"]
+        owners = values.get("owner_email", [])
+        owners = owners + [""] * (len(uuids) - len(owners))
+
+        index = {}
+        for i, (uuid, owner) in enumerate(zip(uuids, owners)):
+            if str(uuid) != "":
+                index.setdefault(str(uuid), (i + 2, str(owner)))  # ヘッダー分
+        with self._index_lock:
+            self._row_index = index
+        return index
+
+    def _lookup_row(self, worksheet, uuid):
+        with self._index_lock:
+            index = self._row_index
+        if index is None or str(uuid) not in index:
+            # 索引が無い・古い（他のプロセスが追加した）ときだけ読み直す
+            index = self._load_row_index(worksheet)
+        return index.get(str(uuid))
+
+    def _find_row(self, worksheet, uuid):
+        # 索引の行にまだその議題があるかを1セル読んで確かめる。他のプロセス（アーカイブや
+        # 別のレプリカ）が行を消すと下の行が上にずれるので、違っていれば索引を読み直す
+        found = self._lookup_row(worksheet, uuid)
+        if found is None:
+            return None
+        uuid_col = self._header(worksheet).index("uuid") + 1
+        if str(worksheet.cell(found[0], uuid_col).value) == str(uuid):
+            return found
+        return self._load_row_index(worksheet).get(str(uuid))
+
+    def update_topic_status(self, uuid, status, owner_email=None):
+        def _update(worksheet):
+            found = self._find_row(worksheet, uuid)
+            if found is None:
+                return False
+            row_number, owner = found
+            if owner_email is not None and normalize_email(owner) != normalize_email(owner_email):
+                return False
+
+            status_col = self._header(worksheet).index("status") + 1
+            worksheet.update_cell(row_number, status_col, status)
+            return True
+
+        return bool(with_worksheet("topics", _update))
+
+    # ---------------------------------------------------------
+    # アーカイブ（topics_archive / votes_archive シート）
+    # ---------------------------------------------------------
+    # 移す議題と投票をアーカイブ側へ append_rows でまとめて書き、
+    # 元のシートからは batchUpdate 1回で行を消す。
+    # 先に書いてから消すので、途中で止まっても行は失われない
+    # （次に実行したとき、アーカイブに既にある議題は書かずに消すだけにする）。
+    def read_archived_topics(self):
+        return self._read_if_exists("topics_archive")
+
+    def read_archived_votes(self):
+        return self._read_if_exists("votes_archive")
+
+    def _read_if_exists(self, name):
+        worksheet = find_worksheet(name)
+        if worksheet is None:
+            return pd.DataFrame(columns=self.DEFAULT_HEADERS[name])
+        return pd.DataFrame(worksheet.get_all_records())
+
+    def archive_topics(self, uuids):
+        targets = {str(u) for u in uuids}
+        if not targets:
+            return []
+
+        # 行を消している間に votes の差分同期が走らないようにする
+        with self._votes_lock:
+            topics_ws = get_worksheet("topics")
+            votes_ws = get_worksheet("votes")
+            if topics_ws is None or votes_ws is None:
+                return []
+
+            topic_header, topic_rows = _rows_with_uuid(topics_ws.get_all_values(), targets)
+            if not topic_rows:
+                return []
+            moving = {record["uuid"] for _, record in topic_rows}
+            vote_header, vote_rows = _rows_with_uuid(votes_ws.get_all_values(), moving)
+
+            topics_archive = create_worksheet("topics_archive", topic_header)
+            votes_archive = create_worksheet("votes_archive", vote_header)
+            already = self._archived_uuids(topics_archive)
+
+            new_topics = [self._to_row(topics_archive, r) for _, r in topic_rows if r["uuid"] not in already]
+            new_votes = [self._to_row(votes_archive, r) for _, r in vote_rows if r["uuid"] not in already]
+            if new_topics:
+                topics_archive.append_rows(new_topics)
+            if new_votes:
+                votes_archive.append_rows(new_votes)
+
+            requests = (
+                _delete_rows_requests(votes_ws, [n for n, _ in vote_rows])
+                + _delete_rows_requests(topics_ws, [n for n, _ in topic_rows])
+            )
+            sheet = connect_to_sheet()
+            _call_with_retry(
+                "sheets.batch_update",
+                lambda: sheet.batch_update({"requests": requests}),
+                is_write=True,
+                count_rows=lambda result: len(vote_rows) + len(topic_rows),
+            )
+
+            # 行番号がずれたので、索引と votes の同期状態は次に使うときに作り直す
+            with self._index_lock:
+                self._row_index = None
+            self._votes_frame = None
+        return sorted(moving)
+
+    def _archived_uuids(self, worksheet):
+        header = self._header(worksheet)
+        if "uuid" not in header:
+            return set()
+        column, = worksheet.batch_get([_column_range(header, "uuid")])
+        return {row[0] for row in column if row}
+
+
+def _rows_with_uuid(values, uuids):
+    # get_all_values の結果から uuid が uuids に含まれる行を (行番号, dict) で返す
+    header = [h for h in (values[0] if values else []) if h]
+    if "uuid" not in header:
+        return header, []
+    rows = []
+    for row_number, row in enumerate(values[1:], start=2):
+        record = dict(zip(header, _pad(row, len(header))))
+        if record["uuid"] in uuids:
+            rows.append((row_number, record))
+    return header, rows
+
+
+def _delete_rows_requests(worksheet, row_numbers):
+    # 連続した行はまとめ、下の行から消す（上から消すと後の行番号がずれる）
+    runs = []
+    for n in sorted(row_numbers):
+        if runs and runs[-1][1] == n - 1:
+            runs[-1][1] = n
+        else:
+            runs.append([n, n])
+    return [
+        {"deleteDimension": {"range": {
+            "sheetId": worksheet.id,
+            "dimension": "ROWS",
+            "startIndex": start - 1,
+            "endIndex": end,
+        }}}
+        for start, end in reversed(runs)
+    ]
+
+
+def _pad(row, width):
+    # 右端の空セルは API の応答で省かれるので列数を揃える
+    row = list(row[:width])
+    return row + [""] * (width - len(row))
+
+
+def _column_range(header, name):
+    # 2行目から最終行までの1列分（例: "H2:H"）
+    top = rowcol_to_a1(2, header.index(name) + 1)
+    return f"{top}:{top.rstrip('0123456789')}"
+
+
+def _appended_row_number(response):
+    # append_rows の応答 {"updates": {"updatedRange": "topics!A10:H12"}} から最初の行番号を取り出す
+    updated_range = (response or {}).get("updates", {}).get("updatedRange", "")
+    match = re.search(r"![A-Z]+(\d+)", updated_range)
+    return int(match.group(1)) if match else None
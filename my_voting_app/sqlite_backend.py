@@ -0,0 +1,230 @@
+import os
+import sqlite3
+import threading
+import pandas as pd
+from storage import StorageBackend, normalize_email, TOPIC_COLUMNS, VOTE_COLUMNS, OPTION_COLUMNS
+
+# ---------------------------------------------------------
+# ローカル SQLite 版の保存先
+# ---------------------------------------------------------
+# WALモードなので読み込みと書き込みが同時に走ってもお互いを待たない。
+# ネットワークなしでアプリ全体を動かしたり、ベンチマークを取ったりするときに使う。
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS topics (
+    uuid        TEXT PRIMARY KEY,
+    title       TEXT NOT NULL,
+    author      TEXT,
+    options     TEXT,
+    deadline    TEXT,
+    created_at  TEXT,
+    status      TEXT NOT NULL DEFAULT 'active',
+    owner_email TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_topics_deadline ON topics (deadline);
+
+CREATE TABLE IF NOT EXISTS votes (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic_title TEXT,
+    option      TEXT,
+    voted_at    TEXT,
+    voted_email TEXT,
+    uuid        TEXT NOT NULL,
+    option_id   INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_votes_uuid_email ON votes (uuid, voted_email);
+
+-- 議題ごとの選択肢（option_id は議題の中で 0, 1, 2, ...）
+CREATE TABLE IF NOT EXISTS options (
+    uuid        TEXT NOT NULL,
+    option_id   INTEGER NOT NULL,
+    option      TEXT NOT NULL,
+    PRIMARY KEY (uuid, option_id)
+);
+
+-- アーカイブ（列は topics / votes と同じ）
+CREATE TABLE IF NOT EXISTS topics_archive (
+    uuid        TEXT PRIMARY KEY,
+    title       TEXT NOT NULL,
+    author      TEXT,
+    options     TEXT,
+    deadline    TEXT,
+    created_at  TEXT,
+    status      TEXT NOT NULL DEFAULT 'active',
+    owner_email TEXT
+);
+
+CREATE TABLE IF NOT EXISTS votes_archive (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic_title TEXT,
+    option      TEXT,
+    voted_at    TEXT,
+    voted_email TEXT,
+    uuid        TEXT NOT NULL,
+    option_id   INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_votes_archive_uuid ON votes_archive (uuid);
+"""
+
+# IN (...) に一度に渡す uuid の数（SQLite のパラメータ数の上限より小さく）
+_IN_CHUNK = 500
+# 後から足した列（古いデータベースには ALTER TABLE で足す）
+_ADDED_COLUMNS = {"votes": ["option_id INTEGER"], "votes_archive": ["option_id INTEGER"]}
+
+
+def _select_list(columns):
+    # option_id の NULL は空文字で返す（シート版と同じく、無い値は ""）
+    return ", ".join("ifnull(option_id, '') AS option_id" if c == "option_id" else c for c in columns)
+
+
+class SQLiteBackend(StorageBackend):
+    def __init__(self, path):
+        self.path = path
+        # sqlite3 の接続はスレッドをまたいで使えないので、スレッドごとに持つ
+        self._local = threading.local()
+        self._writes = 0  # このプロセスでの書き込み回数（data_version 用）
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+            for table, columns in _ADDED_COLUMNS.items():
+                existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                for column in columns:
+                    if column.split()[0] not in existing:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _read(self, table, columns):
+        query = f"SELECT {_select_list(columns)} FROM {table} ORDER BY rowid"
+        return pd.read_sql_query(query, self._conn()).fillna("")
+
+    def read_topics(self):
+        return self._read("topics", TOPIC_COLUMNS)
+
+    def read_votes(self):
+        return self._read("votes", VOTE_COLUMNS)
+
+    def data_version(self):
+        # 書き込みは WAL ファイル（チェックポイント後は本体）に入るので、両方の更新時刻を見る。
+        # 同じプロセス内の書き込みはファイル時刻の分解能に関係なく数で分かるようにする
+        stamps = [self._writes]
+        for path in (self.path, self.path + "-wal"):
+            try:
+                stamps.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                stamps.append(0)
+        return tuple(stamps)
+
+    def iter_votes(self, chunk_rows, archived=False):
+        table = "votes_archive" if archived else "votes"
+        query = f"SELECT {_select_list(VOTE_COLUMNS)} FROM {table} ORDER BY rowid"
+        for chunk in pd.read_sql_query(query, self._conn(), chunksize=chunk_rows):
+            yield chunk.fillna("")
+
+    def append_topics(self, records):
+        placeholders = ", ".join("?" for _ in TOPIC_COLUMNS)
+        with self._conn() as conn:
+            conn.executemany(
+                f"INSERT INTO topics ({', '.join(TOPIC_COLUMNS)}) VALUES ({placeholders})",
+                [[r.get(col, "") for col in TOPIC_COLUMNS] for r in records],
+            )
+        self._writes += 1
+        return True
+
+    def append_votes(self, records):
+        placeholders = ", ".join("?" for _ in VOTE_COLUMNS)
+        with self._conn() as conn:
+            conn.executemany(
+                f"INSERT INTO votes ({', '.join(VOTE_COLUMNS)}) VALUES ({placeholders})",
+                [_vote_row(r) for r in records],
+            )
+        self._writes += 1
+        return True
+
+    def is_transient_error(self, e):
+        # 他のプロセスが書き込み中（database is locked / busy）なら待てば通る
+        if isinstance(e, sqlite3.OperationalError):
+            return "locked" in str(e) or "busy" in str(e)
+        return super().is_transient_error(e)
+
+    def read_options(self):
+        return self._read("options", OPTION_COLUMNS)
+
+    def append_options(self, records):
+        placeholders = ", ".join("?" for _ in OPTION_COLUMNS)
+        with self._conn() as conn:
+            conn.executemany(
+                f"INSERT OR IGNORE INTO options ({', '.join(OPTION_COLUMNS)}) VALUES ({placeholders})",
+                [[r.get(col, "") for col in OPTION_COLUMNS] for r in records],
+            )
+        self._writes += 1
+        return True
+
+    def replace_vote_options(self, options, option_ids, archived=False):
+        table = "votes_archive" if archived else "votes"
+        with self._conn() as conn:
+            rowids = [row[0] for row in conn.execute(f"SELECT rowid FROM {table} ORDER BY rowid")]
+            conn.executemany(
+                f"UPDATE {table} SET option = ?, option_id = ? WHERE rowid = ?",
+                [(option, None if option_id == "" else int(option_id), rowid)
+                 for option, option_id, rowid in zip(options, option_ids, rowids)],
+            )
+        self._writes += 1
+        return True
+
+    def update_topic_status(self, uuid, status, owner_email=None):
+        query = "UPDATE topics SET status = ? WHERE uuid = ?"
+        params = [status, str(uuid)]
+        if owner_email is not None:
+            query += " AND lower(trim(owner_email)) = ?"
+            params.append(normalize_email(owner_email))
+        with self._conn() as conn:
+            cur = conn.execute(query, params)
+        self._writes += 1
+        return cur.rowcount > 0
+
+    def read_archived_topics(self):
+        return self._read("topics_archive", TOPIC_COLUMNS)
+
+    def read_archived_votes(self):
+        return self._read("votes_archive", VOTE_COLUMNS)
+
+    def archive_topics(self, uuids):
+        uuids = [str(u) for u in uuids]
+        topic_cols = ", ".join(TOPIC_COLUMNS)
+        vote_cols = ", ".join(VOTE_COLUMNS)
+        archived = []
+        # コピーと削除を1つのトランザクションで行う（途中で落ちても片方だけにならない）
+        with self._conn() as conn:
+            for i in range(0, len(uuids), _IN_CHUNK):
+                chunk = uuids[i:i + _IN_CHUNK]
+                marks = ", ".join("?" for _ in chunk)
+                rows = conn.execute(f"SELECT uuid FROM topics WHERE uuid IN ({marks})", chunk).fetchall()
+                archived.extend(row[0] for row in rows)
+                conn.execute(
+                    f"INSERT OR IGNORE INTO topics_archive ({topic_cols}) "
+                    f"SELECT {topic_cols} FROM topics WHERE uuid IN ({marks})", chunk)
+                conn.execute(
+                    f"INSERT INTO votes_archive ({vote_cols}) "
+                    f"SELECT {vote_cols} FROM votes WHERE uuid IN ({marks}) ORDER BY id", chunk)
+                conn.execute(f"DELETE FROM votes WHERE uuid IN ({marks})", chunk)
+                conn.execute(f"DELETE FROM topics WHERE uuid IN ({marks})", chunk)
+        self._writes += 1
+        return archived
+
+
+def _vote_row(record):
+    # 選択肢の番号がある票は文字列を保存しない（行が小さくなる）
+    option_id = record.get("option_id", "")
+    option_id = None if option_id in ("", None) else int(option_id)
+    option = "" if option_id is not None else record.get("option", "")
+    return [option if col == "option" else option_id if col == "option_id" else record.get(col, "")
+            for col in VOTE_COLUMNS]
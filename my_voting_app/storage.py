@@ -0,0 +1,159 @@
+import logging
+import threading
+from settings import get_setting
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------
+# 保存先（バックエンド）の共通インターフェース
+# ---------------------------------------------------------
+# db_handler はこのインターフェースだけを使う。
+# 実装は Googleスプレッドシート（sheets_backend.py）と
+# ローカルの SQLite（sqlite_backend.py）の2つ。
+# secrets.toml の [storage] backend = "sheets" / "sqlite" で切り替える。
+
+# 議題・投票・選択肢の列（スプレッドシートのヘッダー行と同じ名前）
+TOPIC_COLUMNS = ["title", "author", "options", "deadline", "created_at", "status", "owner_email", "uuid"]
+VOTE_COLUMNS = ["topic_title", "option", "voted_at", "voted_email", "uuid", "option_id"]
+# 選択肢は議題ごとに 0, 1, 2, ... の番号（option_id）を振って別の表に持つ。
+# 選択式の投票は option_id だけを保存し（option は空）、自由記述の投票は option に文章を入れる。
+# topics の options 列は、自由記述の議題なら "FREE_INPUT"、選択式なら空（"/" 区切りの選択肢が
+# 入っているのは、選択肢の表に移す前の議題だけ）。
+OPTION_COLUMNS = ["uuid", "option_id", "option"]
+
+
+def normalize_email(email):
+    # 大文字・小文字や前後の空白の違いで別人扱いしないようにそろえる
+    return str(email or "").strip().lower()
+
+
+class StorageBackend:
+    # True の場合、投票は db_handler の書き込み待ち行列でまとめて書き込む
+    batch_writes = False
+
+    # 議題一覧を DataFrame で返す（接続できないときは None）
+    def read_topics(self):
+        raise NotImplementedError
+
+    # 投票一覧を DataFrame で返す（接続できないときは None）
+    def read_votes(self):
+        raise NotImplementedError
+
+    # record: TOPIC_COLUMNS をキーに持つ dict。書き込めたら True（接続できないときは False）
+    def append_topic(self, record):
+        return self.append_topics([record])
+
+    # records: TOPIC_COLUMNS をキーに持つ dict のリスト。1回の書き込みでまとめて追加する。書き込めたら True
+    def append_topics(self, records):
+        raise NotImplementedError
+
+    # records: VOTE_COLUMNS をキーに持つ dict のリスト。書き込めたら True。
+    # option_id がある票は option（選択肢の文字列）を保存しなくてよい
+    def append_votes(self, records):
+        raise NotImplementedError
+
+    # 選択肢の一覧を OPTION_COLUMNS の DataFrame で返す（まだ無ければ空）
+    def read_options(self):
+        raise NotImplementedError
+
+    # records: OPTION_COLUMNS をキーに持つ dict のリスト。書き込めたら True
+    def append_options(self, records):
+        raise NotImplementedError
+
+    # 移行用：投票の option / option_id 列を書き換える。
+    # options・option_ids は read_votes()（archived=True ならアーカイブ）と同じ並びのリスト
+    def replace_vote_options(self, options, option_ids, archived=False):
+        raise NotImplementedError
+
+    # 書き込みの失敗 e が一時的で、しかも保存先に書かれていないと分かるもの（送り直しても
+    # 票が二重にならない）なら True。投票の書き込み待ち行列が、再送するか諦めるかを決めるのに使う
+    def is_transient_error(self, e):
+        return isinstance(e, ConnectionRefusedError)
+
+    # 最初の読み込みを待たせないよう、接続など時間のかかる準備を先に済ませておく（任意）
+    def warm_up(self):
+        pass
+
+    # データが変わったら変わる値（中身は問わない。比べるだけ）。
+    # 全件を読まずに「前回から変わったか」を確かめるのに使う
+    def data_version(self):
+        raise NotImplementedError
+
+    # 投票を chunk_rows 行ずつの DataFrame で順に返す（全件をメモリに載せない書き出し用）。
+    # archived=True ならアーカイブの投票
+    def iter_votes(self, chunk_rows, archived=False):
+        raise NotImplementedError
+
+    # uuid の議題の status を書き換える。owner_email を渡した場合は作成者も一致したときだけ。
+    # 書き換えたら True
+    def update_topic_status(self, uuid, status, owner_email=None):
+        raise NotImplementedError
+
+    # ---------------------------------------------------------
+    # アーカイブ（終わった議題と投票の保管場所）
+    # ---------------------------------------------------------
+    # 終わった議題を毎回の読み込みに含めないよう、議題とその投票をまとめて
+    # アーカイブへ移す。アーカイブは投票結果ページで必要なときだけ読む。
+
+    # uuids の議題とその投票をアーカイブへ移す。移した議題の uuid のリストを返す
+    def archive_topics(self, uuids):
+        raise NotImplementedError
+
+    # アーカイブ済みの議題を DataFrame で返す（まだ無ければ空）
+    def read_archived_topics(self):
+        raise NotImplementedError
+
+    # アーカイブ済みの投票を DataFrame で返す（まだ無ければ空）
+    def read_archived_votes(self):
+        raise NotImplementedError
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_warm_up_thread = None
+
+
+def create_backend(name=None):
+    name = (name or get_setting("storage", "backend", "sheets")).lower()
+    if name == "sqlite":
+        from sqlite_backend import SQLiteBackend
+        return SQLiteBackend(get_setting("storage", "sqlite_path", "voting_app.db"))
+    if name == "sheets":
+        from sheets_backend import SheetsBackend
+        return SheetsBackend()
+    raise ValueError(f"不明な保存先です: {name}")
+
+
+def get_backend():
+    # プロセス内で1つだけ作って使い回す
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend()
+        return _backend
+
+
+def warm_up_backend():
+    # ログイン画面を見ている間に、保存先の読み込み（gspread など）と接続を済ませておく。
+    # プロセスごとに1回だけ、バックグラウンドで行う
+    global _warm_up_thread
+    with _backend_lock:
+        if _warm_up_thread is not None:
+            return
+        _warm_up_thread = threading.Thread(target=_warm_up, name="storage-warm-up", daemon=True)
+    _warm_up_thread.start()
+
+
+def _warm_up():
+    try:
+        get_backend().warm_up()
+    except Exception as e:
+        # 失敗しても最初の読み込みのときにやり直すだけ
+        logger.warning("保存先の準備に失敗しました: %s", e)
+
+
+def set_backend(backend):
+    # テスト・ベンチマーク用に保存先を差し替える
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -0,0 +1,97 @@
+import datetime
+import io
+import pandas as pd
+from db_handler import DEADLINE_FORMAT
+from settings import get_setting
+
+# ---------------------------------------------------------
+# CSV / TSV からの議題のまとめて作成
+# ---------------------------------------------------------
+# 会議の議題を何十件も1件ずつフォームで作らなくて済むよう、表から読み込む。
+# 1行に1議題。見出し行の列名（日本語の見出しも可）：
+#   title    : タイトル（必須）
+#   author   : 作成者名
+#   options  : 選択肢を "/" 区切りで（例：賛成/反対/保留）。自由記述なら空でよい
+#   deadline : 締め切り "2025-04-01 18:00"（日本時間。日付は "/" 区切りでも可）
+#   type     : 回答形式 choice / free（選択肢 / 自由記述 も可。空なら choice）
+# 全行をまとめて（1行ずつのループなしで）新規作成フォームと同じ規則で確かめる。
+
+COLUMNS = ["title", "author", "options", "deadline", "type"]
+COLUMN_ALIASES = {
+    "タイトル": "title", "議題": "title",
+    "作成者": "author", "作成者名": "author",
+    "選択肢": "options",
+    "締め切り": "deadline", "締切": "deadline",
+    "回答形式": "type", "形式": "type",
+}
+TYPE_ALIASES = {
+    "": "choice", "choice": "choice", "選択肢": "choice", "選択肢から選ぶ": "choice",
+    "free": "free", "free_input": "free", "自由記述": "free",
+}
+# 一度に作れる議題の数
+MAX_ROWS = get_setting("bulk_create", "max_rows", 200)
+JST = datetime.timezone(datetime.timedelta(hours=9), "JST")
+
+
+def read_table(data, filename=""):
+    # data: アップロードされたファイルの中身（bytes）。戻り値：全部文字列の DataFrame
+    sep = "\t" if filename.lower().endswith((".tsv", ".txt")) else ","
+    # Excel で保存した CSV は Shift_JIS のことが多い
+    for encoding in ("utf-8-sig", "cp932"):
+        try:
+            text = data.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValueError("文字コードを読み取れません。UTF-8 か Shift_JIS で保存してください。")
+
+    try:
+        df = pd.read_csv(io.StringIO(text), sep=sep, dtype=str, keep_default_na=False)
+    except (pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+        raise ValueError(f"ファイルを表として読めません: {e}")
+    df.columns = [COLUMN_ALIASES.get(str(c).strip(), str(c).strip().lower()) for c in df.columns]
+    return df
+
+
+def validate(df, now=None):
+    # 戻り値：(作成する議題の DataFrame[title, author, options, deadline], 問題の DataFrame[行, 内容])
+    # options は選択肢のリスト（自由記述なら "FREE_INPUT"）
+    # 「行」はファイルの行番号（見出しが1行目）
+    if "title" not in df.columns or "deadline" not in df.columns:
+        raise ValueError("見出し行に title と deadline の列が必要です。")
+    df = df.reindex(columns=COLUMNS, fill_value="").fillna("").astype(str)
+    df = df.apply(lambda column: column.str.strip())
+    # 空の行（区切り文字だけの行）は無視する
+    df = df[(df != "").any(axis=1)]
+    if len(df) > MAX_ROWS:
+        raise ValueError(f"一度に作成できるのは {MAX_ROWS} 件までです（{len(df)} 件あります）。")
+    now = datetime.datetime.now(JST).replace(tzinfo=None) if now is None else now
+
+    kind = df["type"].str.lower().map(TYPE_ALIASES)
+    deadline = pd.to_datetime(df["deadline"].str.replace("/", "-", regex=False), format=DEADLINE_FORMAT, errors="coerce")
+    # 選択肢は1列に縦に並べ、空のものを除いて数える
+    options = df["options"].str.split("/").explode().str.strip()
+    options = options[options != ""]
+    n_options = options.groupby(level=0).size().reindex(df.index, fill_value=0)
+    option_lists = options.groupby(level=0).agg(list).reindex(df.index)
+
+    checks = [
+        (df["title"] == "", "タイトルが空です。"),
+        (kind.isna(), "回答形式は choice（選択肢）か free（自由記述）にしてください。"),
+        (deadline.isna(), "締め切りは「2025-04-01 18:00」の形で入力してください。"),
+        (deadline <= now, "締め切り時間が過去になっています。"),
+        ((kind == "choice") & (n_options < 2), "選択肢は少なくとも2つ以上入力してください。"),
+    ]
+    errors = pd.concat(
+        [pd.DataFrame({"行": df.index[mask] + 2, "内容": message}) for mask, message in checks],
+        ignore_index=True,
+    ).sort_values("行", kind="stable", ignore_index=True)
+
+    topics = pd.DataFrame({
+        "title": df["title"],
+        "author": df["author"],
+        "options": option_lists.where((kind == "choice") & option_lists.notna(), "FREE_INPUT"),
+        "deadline": deadline.dt.strftime(DEADLINE_FORMAT),
+    }).reset_index(drop=True)
+    return topics, errors